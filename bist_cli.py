@@ -0,0 +1,186 @@
+"""
+Headless batch runs of the BIST dashboard scans (cron, benchmarking).
+
+Runs the same functions as the Streamlit UI - screener, market summary, value
+finder, SMA50 breadth and the bulk financial import - without a browser session,
+writes each stage's results to CSV/Parquet/JSON and reports per-stage timings.
+
+    python bist_cli.py screener summary --interval 1d --workers 16
+    python bist_cli.py import value --universe bist100 --format parquet --out results/
+    python bist_cli.py all --interval 1h --cpu-workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import streamlit.logger
+from streamlit import config
+
+# The app module runs its page setup on import; outside `streamlit run` that only logs
+# warnings. Parse the config first - it resets the log level when loaded.
+config.get_config_options()
+streamlit.logger.set_log_level("error")
+
+import pandas as pd
+import streamlit_app as app
+
+STAGES = ["import", "screener", "summary", "value", "breadth"]
+UNIVERSES = {
+    "all": app.IMKB,
+    "bist30": [s for s in app.BIST_30 if s in app.IMKB],
+    "bist100": [s for s in app.BIST_100 if s in app.IMKB],
+}
+
+
+def _progress(stage, quiet):
+    """progress(done, total, symbol) callback printing a single updating line."""
+    def progress(done, total, symbol):
+        if not quiet:
+            end = "\n" if done == total else ""
+            print(f"\r  {stage}: {done}/{total} {symbol:<8}", end=end, file=sys.stderr, flush=True)
+    return progress
+
+
+def run_import(args, symbols):
+    success, errors = app.import_all_financials(symbols, workers=args.import_workers,
+                                                progress=_progress("import", args.quiet))
+    failed = set(errors)
+    return pd.DataFrame({"symbol": symbols, "imported": [s not in failed for s in symbols]}), errors
+
+
+def run_screener(args, symbols):
+    errors = []
+    rows = app.screen_chosen_stocks(symbols, interval=args.interval, workers=args.workers,
+                                    allow_live=args.live_valuations, progress=_progress("screener", args.quiet),
+                                    errors=errors)
+    df = pd.DataFrame(rows, columns=app.SCREENER_COLUMNS)
+    return df.sort_values("indicator_score_2", ascending=False), errors
+
+
+def run_summary(args, symbols):
+    record = app.run_market_summary(symbols, interval=args.interval, workers=args.workers,
+                                    progress=_progress("summary", args.quiet))
+    sma50 = {s: "above" for s in record["above_sma50"]}
+    sma50.update({s: "below" for s in record["below_sma50"]})
+    rows = [{"symbol": s, "sentiment": sentiment, "sma50": sma50.get(s)}
+            for sentiment, members in record["sentiment"].items() for s in members]
+    return pd.DataFrame(rows, columns=["symbol", "sentiment", "sma50"]), record["sentiment"]["ERROR"]
+
+
+def run_value(args, symbols):
+    errors = []
+    rows = app.scan_value_finder(symbols, interval=args.interval, workers=args.workers,
+                                 progress=_progress("value", args.quiet), errors=errors)
+    return pd.DataFrame(rows, columns=app.VALUE_FINDER_COLUMNS), errors
+
+
+def run_breadth(args, symbols):
+    errors = []
+    df = app.sma50_breadth_history(symbols, days=args.breadth_days, workers=args.workers,
+                                   progress=_progress("breadth", args.quiet), errors=errors)
+    if df is None:
+        df = pd.DataFrame(columns=["count_above", "total", "pct_above"])
+    return df.rename_axis("date").reset_index(), errors
+
+
+# Each runner returns (results frame, symbols that failed to load or import)
+RUNNERS = {"import": run_import, "screener": run_screener, "summary": run_summary,
+           "value": run_value, "breadth": run_breadth}
+# Stages whose results cannot legitimately be empty: no rows means every symbol failed
+EMPTY_MEANS_FAILED = {"value", "breadth"}
+
+
+def write_frame(df, path, fmt):
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)  # needs pyarrow or fastparquet
+    else:
+        df.to_json(path, orient="records", date_format="iso", force_ascii=False, indent=1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run BIST dashboard scans headlessly.")
+    parser.add_argument("stages", nargs="+", choices=STAGES + ["all"],
+                        help="stages to run, in the given order ('all' = every stage)")
+    parser.add_argument("--interval", default="1d", choices=list(app.TIMEFRAMES),
+                        help="timeframe for screener, summary and value finder (default: 1d)")
+    parser.add_argument("--universe", default="all", choices=list(UNIVERSES), help="stock universe (default: all)")
+    parser.add_argument("--symbols", help="comma-separated symbols instead of a universe")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"concurrent symbol fetches (default: {app.FETCH_WORKERS})")
+    parser.add_argument("--cpu-workers", type=int, default=None,
+                        help=f"indicator worker processes (default: {app.CPU_WORKERS})")
+    parser.add_argument("--import-workers", type=int, default=None,
+                        help=f"concurrent financial imports (default: {app.IMPORT_WORKERS})")
+    parser.add_argument("--live-valuations", action="store_true",
+                        help="screener: fetch financials missing from the store")
+    parser.add_argument("--rebuild-bars", action="store_true",
+                        help="drop the local bar store first, so full price history is downloaded again")
+    parser.add_argument("--breadth-days", type=int, default=90, help="breadth history length in days (default: 90)")
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet", "json"], help="output format (default: csv)")
+    parser.add_argument("--out", default="results", help="output directory (default: results)")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = STAGES if "all" in args.stages else list(dict.fromkeys(args.stages))
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else list(UNIVERSES[args.universe])
+    if args.cpu_workers:
+        app.CPU_WORKERS = args.cpu_workers
+    # Fork the indicator workers while this process has no other threads (at most one per CPU)
+    cpu_workers = min(app.CPU_WORKERS, os.cpu_count() or 1) if app.start_cpu_pool() else 1
+    if app.TIMEFRAMES[args.interval]["auth_required"] and not app.setup_tradingview_auth()[0]:
+        print(f"⚠️ {args.interval} needs TradingView credentials (TRADINGVIEW_USERNAME / TRADINGVIEW_PASSWORD)", file=sys.stderr)
+    os.makedirs(args.out, exist_ok=True)
+    if args.rebuild_bars:
+        print(f"🗄️ bar store cleared ({app.clear_stored_bars()} files)", file=sys.stderr)
+
+    timings = []
+    failed = False
+    for stage in stages:
+        suffix = "" if stage in ("import", "breadth") else f"_{args.interval}"
+        path = os.path.join(args.out, f"{stage}{suffix}.{args.format}")
+        started = time.perf_counter()
+        try:
+            df, errors = RUNNERS[stage](args, symbols)
+            seconds = time.perf_counter() - started
+            write_frame(df, path, args.format)
+            errored = len(set(errors))
+            error = None
+            if symbols and (errored >= len(symbols) or (stage in EMPTY_MEANS_FAILED and df.empty)):
+                error = f"no results ({errored}/{len(symbols)} symbols failed to load)"
+        except Exception as e:
+            seconds = time.perf_counter() - started
+            df, path, errored, error = None, None, None, f"{type(e).__name__}: {e}"
+        failed = failed or error is not None
+        timings.append({"stage": stage, "seconds": round(seconds, 2), "rows": None if df is None else len(df),
+                        "fetched": None if errored is None else len(symbols) - errored, "errored": errored,
+                        "output": path, "error": error})
+        rows = "" if df is None else len(df)
+        loaded = "" if errored is None else f"{len(symbols) - errored}/{len(symbols)}"
+        print(f"{'❌' if error else '✅'} {stage:<9} {seconds:8.2f}s  {rows:>5} rows  {loaded:>9} loaded  {error or path}")
+
+    report = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "interval": args.interval,
+        "symbols": len(symbols),
+        "fetch_workers": args.workers or app.FETCH_WORKERS,
+        "cpu_workers": cpu_workers,
+        "total_seconds": round(sum(t["seconds"] for t in timings), 2),
+        "stages": timings,
+    }
+    with open(os.path.join(args.out, "timings.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"⏱️ total {report['total_seconds']:.2f}s for {len(symbols)} symbols")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
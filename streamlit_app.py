@@ -19,6 +19,10 @@ try:
 except ImportError:
     def load_dotenv():
         pass
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = get_script_run_ctx = None
 
 # Suppress SSL warnings for isyatirim API
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -277,53 +281,234 @@ if 'current_timeframe' not in st.session_state:
     st.session_state.current_timeframe = "1d"
 if 'market_summary' not in st.session_state:
     st.session_state.market_summary = {}
-if 'financial_store' not in st.session_state:
-    st.session_state.financial_store = {}  # {symbol: raw_data_dict}
-if 'financial_import_time' not in st.session_state:
-    st.session_state.financial_import_time = None
 if 'financial_import_errors' not in st.session_state:
     st.session_state.financial_import_errors = []
 if 'value_finder_results' not in st.session_state:
     st.session_state.value_finder_results = None
 if 'sma50_breadth' not in st.session_state:
     st.session_state.sma50_breadth = None
+if 'backtest_results' not in st.session_state:
+    st.session_state.backtest_results = None
+if 'sweep_results' not in st.session_state:
+    st.session_state.sweep_results = None
+if 'scan_snapshot_versions' not in st.session_state:
+    st.session_state.scan_snapshot_versions = {}
+if 'screen_runs' not in st.session_state:
+    st.session_state.screen_runs = {}
+if 'confluence_results' not in st.session_state:
+    st.session_state.confluence_results = None
+if 'scan_warnings' not in st.session_state:
+    st.session_state.scan_warnings = {}
+if 'valuation_enrich_results' not in st.session_state:
+    st.session_state.valuation_enrich_results = {}
+if 'financial_import_result' not in st.session_state:
+    st.session_state.financial_import_result = None
 
-FINANCIAL_STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial_store.json")
+FINANCIAL_STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial_store.json")  # legacy format
+FINANCIAL_STORE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial_store.db")
+# Columns of the store's valuation_basis table (see compute_valuation_basis)
+VALUATION_BASIS_FIELDS = [
+    "period", "shares", "total_equity", "ttm_net_profit", "ebitda_period", "ttm_ebitda",
+    "total_debt", "cash", "roe", "has_forecasts", "forecast_net_profit", "forecast_ebitda",
+]
 
-def _save_financial_store():
-    """Persist financial store to JSON file for cross-session use."""
-    try:
-        import json
-        payload = {
-            "import_time": st.session_state.financial_import_time,
-            "data": {}
-        }
-        for symbol, raw_data in st.session_state.financial_store.items():
-            # raw_data keys are ints (years), convert to strings for JSON
-            payload["data"][symbol] = {str(y): v for y, v in raw_data.items()}
-        with open(FINANCIAL_STORE_FILE, 'w') as f:
-            json.dump(payload, f)
-    except Exception:
-        pass  # Non-critical — store still works in session
 
-def _load_financial_store():
-    """Load financial store from JSON file if available and session is empty."""
-    if st.session_state.financial_store:
-        return  # Already loaded
-    try:
+class FinancialStore:
+    """
+    Imported İş Yatırım statements in a SQLite file, one row per (symbol, year).
+    
+    One instance is shared by every session (see get_financial_store). Symbols are
+    read lazily — only when a view asks for them — and the decoded copy is served to
+    all sessions, so treat returned data as read-only. An import is published as a
+    single transaction that also bumps a version number; refresh() compares that
+    version on each rerun, so other sessions pick up a new import without ever
+    seeing a half-written one. Supports the dict-style access the views use:
+    `symbol in store`, `store[symbol]`, `len(store)`.
+    
+    Next to the statements the store keeps a columnar valuation_basis table — the
+    price-independent valuation inputs of each symbol (see compute_valuation_basis),
+    rebuilt only when that symbol is imported.
+    """
+    
+    def __init__(self, path=FINANCIAL_STORE_DB):
+        import threading
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = {}      # symbol -> {year: items}, filled on first access
+        self._symbols = None   # cached symbol index
+        self._basis = None     # cached valuation_basis table (DataFrame indexed by symbol)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS statements ("
+                         "symbol TEXT NOT NULL, year INTEGER NOT NULL, payload TEXT NOT NULL, "
+                         "PRIMARY KEY (symbol, year))")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS valuation_basis (symbol TEXT PRIMARY KEY, period TEXT, "
+                         + ", ".join(f"{c} REAL" for c in VALUATION_BASIS_FIELDS[1:]) + ")")
+            needs_basis = (conn.execute("SELECT COUNT(*) FROM valuation_basis").fetchone()[0] == 0
+                           and conn.execute("SELECT 1 FROM statements LIMIT 1").fetchone() is not None)
+        self._version = self._read_version()
+        self._migrate_json()
+        if needs_basis:
+            self.rebuild_valuation_basis()
+    
+    def _connect(self):
+        import sqlite3
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+    
+    def _migrate_json(self):
+        """One-time import of the old whole-file financial_store.json."""
         import json
-        if os.path.exists(FINANCIAL_STORE_FILE):
+        if not os.path.exists(FINANCIAL_STORE_FILE) or len(self) > 0:
+            return
+        try:
             with open(FINANCIAL_STORE_FILE, 'r') as f:
                 payload = json.load(f)
-            st.session_state.financial_import_time = payload.get("import_time")
-            for symbol, year_data in payload.get("data", {}).items():
-                # Convert string keys back to int years
-                st.session_state.financial_store[symbol] = {int(y): v for y, v in year_data.items()}
-    except Exception:
-        pass
+            # JSON keys are strings — convert back to int years
+            data = {symbol: {int(y): v for y, v in year_data.items()}
+                    for symbol, year_data in payload.get("data", {}).items()}
+            self.publish(data, import_time=payload.get("import_time"))
+            os.replace(FINANCIAL_STORE_FILE, FINANCIAL_STORE_FILE + ".migrated")
+        except Exception:
+            pass  # Non-critical — the store just starts empty
+    
+    def _read_version(self):
+        return int(self._get_meta("version") or 0)
+    
+    @property
+    def version(self):
+        return self._version
+    
+    def refresh(self):
+        """Drop in-memory copies if a newer version was published. One small query; call once per rerun."""
+        version = self._read_version()
+        with self._lock:
+            if version != self._version:
+                self._loaded = {}
+                self._symbols = None
+                self._basis = None
+                self._version = version
+        return version
+    
+    def symbols(self):
+        with self._lock:
+            if self._symbols is None:
+                with self._connect() as conn:
+                    self._symbols = frozenset(row[0] for row in conn.execute("SELECT DISTINCT symbol FROM statements"))
+            return self._symbols
+    
+    def __contains__(self, symbol):
+        return symbol in self.symbols()
+    
+    def __len__(self):
+        return len(self.symbols())
+    
+    def __getitem__(self, symbol):
+        data = self.get(symbol)
+        if data is None:
+            raise KeyError(symbol)
+        return data
+    
+    def get(self, symbol, default=None):
+        """Raw statements {year: items} for one symbol, loaded from disk on first use."""
+        import json
+        with self._lock:
+            if symbol in self._loaded:
+                return self._loaded[symbol]
+        if symbol not in self.symbols():
+            return default
+        with self._connect() as conn:
+            rows = conn.execute("SELECT year, payload FROM statements WHERE symbol = ?", (symbol,)).fetchall()
+        if not rows:
+            return default
+        data = {int(y): json.loads(payload) for y, payload in rows}
+        with self._lock:
+            return self._loaded.setdefault(symbol, data)
+    
+    def valuation_table(self):
+        """The valuation_basis table as a DataFrame indexed by symbol (missing values are NaN)."""
+        with self._lock:
+            if self._basis is None:
+                with self._connect() as conn:
+                    self._basis = pd.read_sql_query("SELECT * FROM valuation_basis", conn, index_col="symbol")
+            return self._basis
+    
+    def valuation_basis(self, symbol):
+        """One symbol's valuation basis as a dict (None for missing values), or None if it has none."""
+        table = self.valuation_table()
+        if symbol not in table.index:
+            return None
+        return {k: (None if pd.isna(v) else v) for k, v in table.loc[symbol].items()}
+    
+    def publish(self, data, import_time=None, bases=None):
+        """
+        Replace the statements of every symbol in `data` ({symbol: {year: items}}) and
+        their valuation bases, and bump the store version — all in one transaction.
+        `bases` ({symbol: basis}) may carry bases computed while importing; missing ones
+        are computed here. Symbols not in `data` are kept.
+        """
+        import json
+        bases = dict(bases or {})
+        for symbol, raw_data in data.items():
+            if symbol not in bases:
+                bases[symbol] = compute_valuation_basis(raw_data)
+        with self._connect() as conn:
+            for symbol, raw_data in data.items():
+                conn.execute("DELETE FROM statements WHERE symbol = ?", (symbol,))
+                conn.executemany("INSERT INTO statements (symbol, year, payload) VALUES (?, ?, ?)",
+                                 [(symbol, int(y), json.dumps(v)) for y, v in raw_data.items()])
+                self._write_basis(conn, symbol, bases[symbol])
+            if import_time:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('import_time', ?)", (import_time,))
+            self._bump_version(conn)
+        self.refresh()
+    
+    def rebuild_valuation_basis(self):
+        """Recompute the valuation basis of every stored symbol (e.g. for stores that predate the table)."""
+        bases = {symbol: compute_valuation_basis(self.get(symbol)) for symbol in self.symbols()}
+        with self._connect() as conn:
+            for symbol, basis in bases.items():
+                self._write_basis(conn, symbol, basis)
+            self._bump_version(conn)
+        self.refresh()
+    
+    @staticmethod
+    def _write_basis(conn, symbol, basis):
+        conn.execute("DELETE FROM valuation_basis WHERE symbol = ?", (symbol,))
+        if basis:
+            conn.execute(f"INSERT INTO valuation_basis (symbol, {', '.join(VALUATION_BASIS_FIELDS)}) "
+                         f"VALUES (?{', ?' * len(VALUATION_BASIS_FIELDS)})",
+                         [symbol] + [basis.get(c) for c in VALUATION_BASIS_FIELDS])
+    
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM statements")
+            conn.execute("DELETE FROM valuation_basis")
+            conn.execute("DELETE FROM meta WHERE key != 'version'")
+            self._bump_version(conn)
+        self.refresh()
+    
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', "
+                     "COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'version'), 0) + 1)")
+    
+    def _get_meta(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    @property
+    def import_time(self):
+        return self._get_meta("import_time")
+
+
+@st.cache_resource
+def get_financial_store():
+    """Process-wide financial store; every session reads the same instance."""
+    return FinancialStore()
 
-# Auto-load on startup
-_load_financial_store()
 
 IMKB = [
     "ALBRK", "GARAN", "HALKB", "ISCTR", "SKBNK", "TSKB", "ICBCT", "KLNMA",
@@ -458,6 +643,16 @@ TIMEFRAMES = {
     "1wk": {"label": "Weekly", "days": 730, "auth_required": False},
 }
 
+# Concurrent OHLCV fetching for full-market scans (network-bound, so threads are enough)
+FETCH_WORKERS = int(os.getenv("BIST_FETCH_WORKERS", "8"))
+FETCH_TIMEOUT = float(os.getenv("BIST_FETCH_TIMEOUT", "30"))  # seconds per symbol
+# Indicator processes for full-market scans in the batch CLI, which forks them at
+# startup (start_cpu_pool). The Streamlit server computes in-process: a whole-market
+# panel takes well under a second, and forking from the threaded server (scheduler,
+# fetch pool, HTTP sessions) risks deadlocking on locks held at fork time.
+CPU_WORKERS = int(os.getenv("BIST_CPU_WORKERS", str(os.cpu_count() or 1)))
+CPU_MIN_SYMBOLS = 64  # smaller panels are computed in-process
+
 # Plotly config optimized for mobile touch interaction
 PLOTLY_CONFIG = {
     'displayModeBar': False,  # Hide toolbar on mobile (saves space)
@@ -502,77 +697,568 @@ def setup_tradingview_auth():
     except:
         return False, "❌ Auth failed"
 
+# =============================================================================
+# LOCAL BAR STORE - persistent OHLCV history with incremental (delta) fetching
+# =============================================================================
+
+# One .npy file per (interval, symbol), memory-mapped on read. Timestamps are
+# UTC nanoseconds; frames are rebuilt in borsapy's Europe/Istanbul timezone.
+BAR_STORE_DIR = os.getenv("BIST_BAR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bar_store"))
+BAR_STORE_ENABLED = os.getenv("BIST_BAR_STORE", "1") != "0"
+BAR_TZ = "Europe/Istanbul"
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+BAR_DTYPE = np.dtype([("ts", "<i8")] + [(f, "<f8") for f in BAR_FIELDS])
+# Largest calendar gap allowed between start_date and the first stored bar
+BAR_STORE_GAP_DAYS = {"1wk": 14}
+# borsapy history is split- and dividend-adjusted: a re-downloaded stored bar whose close
+# moved by more than this (relative) means the history was re-based since it was stored
+BAR_STORE_ADJUST_RTOL = 1e-4
+
+def _bar_store_path(symbol, interval):
+    return os.path.join(BAR_STORE_DIR, interval, f"{symbol}.npy")
+
+def load_stored_bars(symbol, interval, mmap=True):
+    """Return the stored bar array for (symbol, interval), or None if nothing is stored."""
+    path = _bar_store_path(symbol, interval)
+    if not os.path.exists(path):
+        return None
+    try:
+        bars = np.load(path, mmap_mode="r" if mmap else None)
+        return bars if bars.dtype == BAR_DTYPE else None
+    except Exception:
+        return None
+
+def _bars_to_frame(bars):
+    """Convert a stored bar array into an OHLCV DataFrame like the one borsapy returns."""
+    index = pd.to_datetime(np.asarray(bars["ts"]), utc=True).tz_convert(BAR_TZ)
+    df = pd.DataFrame({f: np.asarray(bars[f], dtype=float) for f in BAR_FIELDS}, index=index)
+    df.index.name = "Date"
+    return df
+
+def _frame_to_bars(df):
+    """Convert an OHLCV DataFrame into the structured bar array used on disk."""
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(BAR_TZ)
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars["ts"] = (index - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(1, "ns")  # UTC ns, any index resolution
+    for f in BAR_FIELDS:
+        bars[f] = pd.to_numeric(df[f], errors="coerce").to_numpy(dtype=float)
+    return bars
+
+def _bar_keep_days(interval):
+    """Days of history the store keeps for an interval (three times its default window)."""
+    return max(TIMEFRAMES.get(interval, {}).get("days", 365) * 3, 30)
+
+def save_stored_bars(symbol, interval, df, keep_days=None):
+    """
+    Merge freshly fetched bars into the store and return the merged array.
+    Stored bars inside the fetched time range are replaced (the previous last bar
+    may have been unfinished); bars older than keep_days are dropped.
+    """
+    import threading
+    new = _frame_to_bars(df)
+    new = new[np.argsort(new["ts"], kind="stable")]
+    existing = load_stored_bars(symbol, interval, mmap=False)
+    if existing is not None and len(existing) and len(new):
+        keep = existing[(existing["ts"] < new["ts"][0]) | (existing["ts"] > new["ts"][-1])]
+        merged = np.concatenate([keep, new])
+        merged = merged[np.argsort(merged["ts"], kind="stable")]
+    elif existing is not None and len(existing):
+        merged = existing
+    else:
+        merged = new
+    
+    if keep_days is None:
+        keep_days = _bar_keep_days(interval)
+    cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=keep_days)
+    merged = merged[merged["ts"] >= cutoff.value]
+    
+    # Write to a temp file and swap it in so readers never see a partial file
+    path = _bar_store_path(symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, merged)
+    os.replace(tmp, path)
+    return merged
+
+def clear_stored_bars(symbol=None, interval=None):
+    """
+    Invalidate the bar store: delete the stored bars and persisted streaming indicator
+    state of `symbol` (every symbol if None) for `interval` (every interval if None),
+    plus that state for the intervals resampled from it. The next load downloads the
+    full window again. Returns the number of files removed.
+    """
+    import glob
+    if interval is None:
+        intervals = sorted(os.listdir(BAR_STORE_DIR)) if os.path.isdir(BAR_STORE_DIR) else []
+    else:
+        intervals = [interval]
+    name = glob.escape(symbol) if symbol else "*"
+    patterns = []
+    for iv in intervals:
+        patterns += [os.path.join(BAR_STORE_DIR, iv, f"{name}.npy"), _indicator_state_path(name, iv)]
+        patterns += [_indicator_state_path(name, derived) for derived, base in RESAMPLE_SOURCES.items() if base == iv]
+    removed = 0
+    for path in {p for pattern in patterns for p in glob.glob(pattern)}:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def _fetch_history(symbol, start, end, interval):
+    """Raw borsapy download (start may be a date string or a naive Istanbul datetime)."""
+    ticker = bp.Ticker(symbol)
+    df = ticker.history(start=start, end=end, interval=interval)
+    if df is not None and not df.empty:
+        df.columns = [col.title() for col in df.columns]
+    return df
+
+def fetch_bars_incremental(symbol, start_date, end_date, interval):
+    """
+    Return OHLCV bars for [start_date, end_date] using the local bar store.
+    Only bars from the last completed stored bar onwards are downloaded; the full
+    window is fetched only when the store is empty or does not reach back to
+    start_date, or when the re-downloaded bar's close differs from the stored one
+    (a split or dividend re-based the adjusted history): then the symbol's stored
+    bars are replaced. Falls back to stored bars if the download fails.
+    """
+    window_start = pd.Timestamp(start_date, tz=BAR_TZ)
+    window_end = pd.Timestamp(end_date, tz=BAR_TZ).normalize() + pd.Timedelta(days=1)
+    
+    stored = load_stored_bars(symbol, interval)
+    fetch_start = start_date
+    overlap = None  # (ts, close) of the stored bar the delta download must reproduce
+    if stored is not None and len(stored):
+        # The first stored bar can sit a few days after start_date (weekends, bayram holidays)
+        first = pd.Timestamp(int(stored["ts"][0]), tz="UTC")
+        if first <= window_start + pd.Timedelta(days=BAR_STORE_GAP_DAYS.get(interval, 10)):
+            # Re-request from the bar before the last one: the last may have been unfinished
+            k = max(len(stored) - 2, 0)
+            overlap = (int(stored["ts"][k]), float(stored["Close"][k]))
+            last = pd.Timestamp(overlap[0], tz="UTC").tz_convert(BAR_TZ)
+            fetch_start = last.tz_localize(None).to_pydatetime()
+    
+    bars = stored
+    try:
+        df_new = _fetch_history(symbol, fetch_start, end_date, interval)
+        if df_new is not None and not df_new.empty:
+            if overlap is not None and _history_rebased(df_new, *overlap):
+                df_full = _fetch_history(symbol, start_date, end_date, interval)
+                if df_full is not None and not df_full.empty:
+                    clear_stored_bars(symbol, interval)  # old-basis bars and indicator state
+                    bars = save_stored_bars(symbol, interval, df_full[BAR_FIELDS])
+            else:
+                bars = save_stored_bars(symbol, interval, df_new[BAR_FIELDS])
+    except Exception:
+        pass  # Network/API failure — serve what is already stored
+    
+    if bars is None or not len(bars):
+        return None
+    ts = np.asarray(bars["ts"])
+    in_window = (ts >= window_start.value) & (ts < window_end.value)
+    return _bars_to_frame(bars[in_window])
+
+def _history_rebased(df_new, ts, close):
+    """True unless df_new holds the bar stamped `ts` with (within BAR_STORE_ADJUST_RTOL) the stored close."""
+    new = _frame_to_bars(df_new)
+    hit = new["Close"][new["ts"] == ts]
+    return not (len(hit) and np.isclose(hit[0], close, rtol=BAR_STORE_ADJUST_RTOL, atol=0, equal_nan=True))
+
+# =============================================================================
+# RESAMPLING - coarser intervals aggregated locally from stored base bars
+# =============================================================================
+
+# Derived interval -> base interval it is built from. Each base keeps at least the
+# derived interval's default window (see _bar_keep_days); 1m, 5m, 1h and 1d are
+# always downloaded directly.
+RESAMPLE_SOURCES = {"15m": "5m", "30m": "5m", "4h": "1h", "1wk": "1d"}
+RESAMPLE_MINUTES = {"15m": 15, "30m": 30, "4h": 240}
+# Continuous trading session (Istanbul time); intraday buckets are anchored at the open
+BIST_SESSION_OPEN = pd.Timedelta(hours=10)
+BIST_SESSION_CLOSE = pd.Timedelta(hours=18)
+
+def resample_bars(df, interval):
+    """
+    Aggregate base OHLCV bars into `interval` bars: first Open, max High, min Low,
+    last Close, summed Volume.
+    
+    Intraday buckets start at the 10:00 session open (so 4h bars are 10:00-14:00
+    and 14:00-18:00, never spanning two sessions); bars stamped before the open or
+    after the close (auctions) fold into the session's first or last bucket.
+    Weekly bars are labelled with the Monday of their week. Bars are labelled with
+    their bucket start; the last bucket may still be forming.
+    """
+    if df is None or df.empty:
+        return df
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(BAR_TZ)
+    index = index.tz_convert(BAR_TZ)
+    day = index.normalize()
+    if interval == "1wk":
+        labels = day - pd.to_timedelta(day.weekday, unit="D")
+    else:
+        step = pd.Timedelta(minutes=RESAMPLE_MINUTES[interval])
+        n_buckets = -(-(BIST_SESSION_CLOSE - BIST_SESSION_OPEN) // step)
+        opens = day + BIST_SESSION_OPEN
+        k = np.clip((index - opens) // step, 0, n_buckets - 1)
+        labels = opens + k * step
+    
+    # Base bars are time-sorted, so each bucket is one contiguous run
+    order = np.argsort(index.asi8, kind="stable")
+    keys = labels.asi8[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    values = {f: pd.to_numeric(df[f], errors="coerce").to_numpy(dtype=float)[order] for f in BAR_FIELDS}
+    out = pd.DataFrame({
+        "Open": values["Open"][starts],
+        "High": np.fmax.reduceat(values["High"], starts),
+        "Low": np.fmin.reduceat(values["Low"], starts),
+        "Close": values["Close"][ends],
+        "Volume": np.add.reduceat(np.nan_to_num(values["Volume"]), starts),
+    }, index=pd.DatetimeIndex(labels[order][starts], name="Date"))
+    return out
+
+def fetch_resampled(symbol, start_date, end_date, interval):
+    """
+    OHLCV for a derived interval built from its base interval's bars (one delta
+    download of the base at most, shared with every other interval built from it).
+    Returns None when the base store cannot cover start_date, so the caller
+    downloads the interval directly.
+    """
+    base = RESAMPLE_SOURCES[interval]
+    start = pd.Timestamp(start_date)
+    if start < pd.Timestamp.now().normalize() - pd.Timedelta(days=_bar_keep_days(base)):
+        return None
+    if interval == "1wk":
+        start -= pd.Timedelta(days=start.weekday())  # whole first week
+    df = fetch_stock_data(symbol, start_date=start.strftime("%Y-%m-%d"), end_date=end_date, interval=base)
+    if df is None or df.empty:
+        return None
+    return resample_bars(df[BAR_FIELDS], interval)
+
+def load_stored_frame(symbol, interval, start_date, end_date):
+    """Stored bars for [start_date, end_date] without any network access, resampling derived intervals."""
+    window_start = pd.Timestamp(start_date, tz=BAR_TZ).value
+    window_end = (pd.Timestamp(end_date, tz=BAR_TZ).normalize() + pd.Timedelta(days=1)).value
+    bars = load_stored_bars(symbol, interval)
+    if bars is None and interval in RESAMPLE_SOURCES:
+        df = load_stored_frame(symbol, RESAMPLE_SOURCES[interval], start_date, end_date)
+        return resample_bars(df, interval) if df is not None else None
+    if bars is None:
+        return None
+    ts = np.asarray(bars["ts"])
+    return _bars_to_frame(bars[(ts >= window_start) & (ts < window_end)])
+
 @st.cache_data(ttl=300)
 def fetch_stock_data(symbol, start_date="2023-01-01", end_date=None, interval="1d"):
     try:
         if end_date is None:
             end_date = date.today().strftime("%Y-%m-%d")
-        ticker = bp.Ticker(symbol)
-        df = ticker.history(start=start_date, end=end_date, interval=interval)
-        if df is not None and not df.empty:
-            df.columns = [col.title() for col in df.columns]
-        return df
+        if BAR_STORE_ENABLED:
+            if interval in RESAMPLE_SOURCES:
+                df = fetch_resampled(symbol, start_date, end_date, interval)
+                if df is not None:
+                    return df
+            return fetch_bars_incremental(symbol, start_date, end_date, interval)
+        return _fetch_history(symbol, start_date, end_date, interval)
     except:
         return None
 
-def calculate_all_indicators(df):
+# =============================================================================
+# INDICATOR REGISTRY - every column declares its inputs; only requested columns are computed
+# =============================================================================
+
+# Columns added by calculate_all_indicators, in its order
+INDICATOR_COLUMNS = [
+    "Return", "Return_pct", "Target_Cls", "Vol_diff", "Vol_change",
+    "bb_bbm", "bb_bbh", "bb_bbl", "MACD", "MACDS", "Diff", "Buy_MACD", "Buy_MACDS", "Buy_MACDS2",
+    "VSMA15", "OBV", "RSI", "Buy_RSI", "Buy_RSIS", "AO", "Buy_AO", "Buy_AOS",
+    "CCI", "Buy_CCI", "Buy_CCIS", "EMA10", "EMA30", "Buy_EMA10", "Buy_EMA10S",
+    "Buy_EMA10_EMA30", "Buy_EMA10_EMA30S", "Stochastic", "Stochastic_Buy", "Stochastic_BuyS",
+    "KAMA", "Buy_KAMA", "Buy_KAMAS", "SMA5", "SMA22", "SMA50",
+    "Buy_SMA5", "Buy_SMA22", "Buy_SMA50", "Buy_SMA5S", "Buy_SMA22S", "Buy_SMA50S",
+    "CMF", "Buy_CMF", "Buy_CMFS",
+]
+
+# column -> (function, input columns, all columns the function returns)
+INDICATOR_REGISTRY = {}
+
+def register_indicator(outputs, inputs):
+    """Register fn(cols) -> {column: values} as the producer of `outputs` from `inputs`."""
+    outputs = (outputs,) if isinstance(outputs, str) else tuple(outputs)
+    def deco(fn):
+        for name in outputs:
+            INDICATOR_REGISTRY[name] = (fn, tuple(inputs), outputs)
+        return fn
+    return deco
+
+def _register_signal(flag, inputs, rule):
+    """Register a 0/1 flag column and its crossover column (flag rose since the previous bar)."""
+    register_indicator(flag, inputs)(lambda c: {flag: np.where(rule(c), 1, 0)})
+    register_indicator(f"{flag}S", [flag])(
+        lambda c: {f"{flag}S": np.where(c[flag] > c[flag].shift(1), 1, 0)})
+
+def _resolve_indicators(outputs, available=()):
+    """Registry columns needed for `outputs`, dependencies first; `available` columns are not recomputed."""
+    order, seen = [], set(available)
+    def visit(name):
+        if name in seen or name not in INDICATOR_REGISTRY:
+            return  # already planned/present, or a base OHLCV column
+        seen.add(name)
+        for dep in INDICATOR_REGISTRY[name][1]:
+            visit(dep)
+        order.append(name)
+    for name in outputs:
+        visit(name)
+    return order
+
+def compute_indicators(df, outputs=None):
+    """
+    Add the requested indicator columns (default: all of INDICATOR_COLUMNS) to df,
+    evaluating only their dependency subgraph. Indicator columns df already has are
+    reused, and intermediates such as the MACD EMAs are computed once and not
+    added to df. Returns df.
+    """
     if df is None or df.empty:
         return None
+    outputs = INDICATOR_COLUMNS if outputs is None else list(outputs)
+    wanted = set(outputs)
+    cols = {}
     try:
-        df["Return"] = df["Close"].diff()
-        df["Return_pct"] = df["Close"].pct_change()
-        df["Target_Cls"] = np.where(df.Return > 0, 1, 0)
-        df["Vol_diff"] = df["Volume"].diff()
-        df["Vol_change"] = df["Volume"].pct_change()
-        indicator_bb = BollingerBands(close=df["Close"], window=20, window_dev=2)
-        df["bb_bbm"] = indicator_bb.bollinger_mavg()
-        df["bb_bbh"] = indicator_bb.bollinger_hband()
-        df["bb_bbl"] = indicator_bb.bollinger_lband()
-        df["MACD"] = ta.trend.macd(df["Close"], window_slow=26, window_fast=12, fillna=False)
-        df["MACDS"] = ta.trend.macd_signal(df["Close"], window_sign=9, fillna=False)
-        df["Diff"] = df["MACD"] - df["MACDS"]
-        df["Buy_MACD"] = np.where((df["MACD"] > df["MACDS"]), 1, 0)
-        df["Buy_MACDS"] = np.where((df["Buy_MACD"] > df["Buy_MACD"].shift(1)), 1, 0)
-        df["Buy_MACDS2"] = np.where((df["Diff"] > 0) & (df["Buy_MACDS"] == 1), 2, df["Buy_MACDS"])
-        df['VSMA15'] = ta.trend.sma_indicator(df['Volume'], window=15)
-        df['OBV'] = ta.volume.on_balance_volume(df['Close'], df['Volume'])
-        df["RSI"] = ta.momentum.rsi(df["Close"], window=14, fillna=False)
-        df["Buy_RSI"] = np.where((df["RSI"] > 30), 1, 0)
-        df["Buy_RSIS"] = np.where((df["Buy_RSI"] > df["Buy_RSI"].shift(1)), 1, 0)
-        df["AO"] = ta.momentum.awesome_oscillator(df["High"], df["Low"], window1=5, window2=34, fillna=True)
-        df["Buy_AO"] = np.where((df["AO"] > 0), 1, 0)
-        df["Buy_AOS"] = np.where((df["Buy_AO"] > df["Buy_AO"].shift(1)), 1, 0)
-        df["CCI"] = ta.trend.cci(df["High"], df["Low"], df["Close"], window=20, fillna=False)
-        df["Buy_CCI"] = np.where((df["CCI"] > 0), 1, 0)
-        df["Buy_CCIS"] = np.where((df["Buy_CCI"] > df["Buy_CCI"].shift(1)), 1, 0)
-        df["EMA10"] = ta.trend.ema_indicator(df["Close"], window=10, fillna=False)
-        df["EMA30"] = ta.trend.ema_indicator(df["Close"], window=30, fillna=False)
-        df["Buy_EMA10"] = np.where((df["Close"] > df["EMA10"]), 1, 0)
-        df["Buy_EMA10S"] = np.where((df["Buy_EMA10"] > df["Buy_EMA10"].shift(1)), 1, 0)
-        df["Buy_EMA10_EMA30"] = np.where((df["EMA10"] > df["EMA30"]), 1, 0)
-        df["Buy_EMA10_EMA30S"] = np.where((df["Buy_EMA10_EMA30"] > df["Buy_EMA10_EMA30"].shift(1)), 1, 0)
-        df["Stochastic"] = ta.momentum.stoch_signal(df["High"], df["Low"], df["Close"], window=3, fillna=False)
-        df["Stochastic_Buy"] = np.where((df["Stochastic"] > 20), 1, 0)
-        df["Stochastic_BuyS"] = np.where((df["Stochastic_Buy"] > df["Stochastic_Buy"].shift(1)), 1, 0)
-        df["KAMA"] = ta.momentum.kama(df["Close"], window=10, pow1=2, pow2=30, fillna=False)
-        df["Buy_KAMA"] = np.where((df["Close"] > df["KAMA"]), 1, 0)
-        df["Buy_KAMAS"] = np.where((df["Buy_KAMA"] > df["Buy_KAMA"].shift(1)), 1, 0)
-        df['SMA5'] = ta.trend.sma_indicator(df['Close'], window=5)
-        df['SMA22'] = ta.trend.sma_indicator(df['Close'], window=22)
-        df['SMA50'] = ta.trend.sma_indicator(df['Close'], window=50)
-        df["Buy_SMA5"] = np.where((df["Close"] > df["SMA5"]), 1, 0)
-        df["Buy_SMA22"] = np.where((df["Close"] > df["SMA22"]), 1, 0)
-        df["Buy_SMA50"] = np.where((df["Close"] > df["SMA50"]), 1, 0)
-        df["Buy_SMA5S"] = np.where((df["Buy_SMA5"] > df["Buy_SMA5"].shift(1)), 1, 0)
-        df["Buy_SMA22S"] = np.where((df["Buy_SMA22"] > df["Buy_SMA22"].shift(1)), 1, 0)
-        df["Buy_SMA50S"] = np.where((df["Buy_SMA50"] > df["Buy_SMA50"].shift(1)), 1, 0)
-        df["CMF"] = ta.volume.chaikin_money_flow(df["High"], df["Low"], df["Close"], df["Volume"], window=20, fillna=False)
-        df["Buy_CMF"] = np.where((df["CMF"] > 0), 1, 0)
-        df["Buy_CMFS"] = np.where((df["Buy_CMF"] > df["Buy_CMF"].shift(1)), 1, 0)
+        for name in _resolve_indicators(outputs, available=df.columns):
+            if name in cols:
+                continue  # produced together with an earlier column
+            fn, inputs, _ = INDICATOR_REGISTRY[name]
+            for out, values in fn({k: cols[k] if k in cols else df[k] for k in inputs}).items():
+                cols[out] = values if isinstance(values, pd.Series) else pd.Series(values, index=df.index)
+                if out in wanted:
+                    df[out] = cols[out]
         return df
     except:
         return df
 
+register_indicator("Return", ["Close"])(lambda c: {"Return": c["Close"].diff()})
+register_indicator("Return_pct", ["Close"])(lambda c: {"Return_pct": c["Close"].pct_change()})
+register_indicator("Target_Cls", ["Return"])(lambda c: {"Target_Cls": np.where(c["Return"] > 0, 1, 0)})
+register_indicator("Vol_diff", ["Volume"])(lambda c: {"Vol_diff": c["Volume"].diff()})
+register_indicator("Vol_change", ["Volume"])(lambda c: {"Vol_change": c["Volume"].pct_change()})
+
+@register_indicator(["bb_bbm", "bb_bbh", "bb_bbl"], ["Close"])
+def _ind_bollinger(c):
+    bb = BollingerBands(close=c["Close"], window=20, window_dev=2)
+    return {"bb_bbm": bb.bollinger_mavg(), "bb_bbh": bb.bollinger_hband(), "bb_bbl": bb.bollinger_lband()}
+
+# MACD from two shared EMAs (same as ta.trend.macd / macd_signal, without recomputing them)
+register_indicator("_EMA12", ["Close"])(lambda c: {"_EMA12": ta.trend.ema_indicator(c["Close"], window=12, fillna=False)})
+register_indicator("_EMA26", ["Close"])(lambda c: {"_EMA26": ta.trend.ema_indicator(c["Close"], window=26, fillna=False)})
+register_indicator("MACD", ["_EMA12", "_EMA26"])(lambda c: {"MACD": c["_EMA12"] - c["_EMA26"]})
+register_indicator("MACDS", ["MACD"])(lambda c: {"MACDS": ta.trend.ema_indicator(c["MACD"], window=9, fillna=False)})
+register_indicator("Diff", ["MACD", "MACDS"])(lambda c: {"Diff": c["MACD"] - c["MACDS"]})
+_register_signal("Buy_MACD", ["MACD", "MACDS"], lambda c: c["MACD"] > c["MACDS"])
+register_indicator("Buy_MACDS2", ["Diff", "Buy_MACDS"])(
+    lambda c: {"Buy_MACDS2": np.where((c["Diff"] > 0) & (c["Buy_MACDS"] == 1), 2, c["Buy_MACDS"])})
+
+register_indicator("VSMA15", ["Volume"])(lambda c: {"VSMA15": ta.trend.sma_indicator(c["Volume"], window=15)})
+register_indicator("OBV", ["Close", "Volume"])(lambda c: {"OBV": ta.volume.on_balance_volume(c["Close"], c["Volume"])})
+
+register_indicator("RSI", ["Close"])(lambda c: {"RSI": ta.momentum.rsi(c["Close"], window=14, fillna=False)})
+_register_signal("Buy_RSI", ["RSI"], lambda c: c["RSI"] > 30)
+
+register_indicator("AO", ["High", "Low"])(
+    lambda c: {"AO": ta.momentum.awesome_oscillator(c["High"], c["Low"], window1=5, window2=34, fillna=True)})
+_register_signal("Buy_AO", ["AO"], lambda c: c["AO"] > 0)
+
+register_indicator("CCI", ["High", "Low", "Close"])(
+    lambda c: {"CCI": ta.trend.cci(c["High"], c["Low"], c["Close"], window=20, fillna=False)})
+_register_signal("Buy_CCI", ["CCI"], lambda c: c["CCI"] > 0)
+
+register_indicator("EMA10", ["Close"])(lambda c: {"EMA10": ta.trend.ema_indicator(c["Close"], window=10, fillna=False)})
+register_indicator("EMA30", ["Close"])(lambda c: {"EMA30": ta.trend.ema_indicator(c["Close"], window=30, fillna=False)})
+_register_signal("Buy_EMA10", ["Close", "EMA10"], lambda c: c["Close"] > c["EMA10"])
+_register_signal("Buy_EMA10_EMA30", ["EMA10", "EMA30"], lambda c: c["EMA10"] > c["EMA30"])
+
+register_indicator("Stochastic", ["High", "Low", "Close"])(
+    lambda c: {"Stochastic": ta.momentum.stoch_signal(c["High"], c["Low"], c["Close"], window=3, fillna=False)})
+_register_signal("Stochastic_Buy", ["Stochastic"], lambda c: c["Stochastic"] > 20)
+
+register_indicator("KAMA", ["Close"])(
+    lambda c: {"KAMA": ta.momentum.kama(c["Close"], window=10, pow1=2, pow2=30, fillna=False)})
+_register_signal("Buy_KAMA", ["Close", "KAMA"], lambda c: c["Close"] > c["KAMA"])
+
+for _window in (5, 22, 50):
+    register_indicator(f"SMA{_window}", ["Close"])(
+        lambda c, w=_window: {f"SMA{w}": ta.trend.sma_indicator(c["Close"], window=w)})
+    _register_signal(f"Buy_SMA{_window}", ["Close", f"SMA{_window}"], lambda c, w=_window: c["Close"] > c[f"SMA{w}"])
+
+register_indicator("CMF", ["High", "Low", "Close", "Volume"])(
+    lambda c: {"CMF": ta.volume.chaikin_money_flow(c["High"], c["Low"], c["Close"], c["Volume"], window=20, fillna=False)})
+_register_signal("Buy_CMF", ["CMF"], lambda c: c["CMF"] > 0)
+
+def calculate_all_indicators(df):
+    return compute_indicators(df)
+
+# Columns read by calculate_original_scores
+SCORE_FLAG_COLUMNS = [
+    "Buy_MACDS2", "Buy_AOS", "Buy_EMA10_EMA30S", "Buy_SMA5S", "Buy_SMA22S",
+    "Buy_RSIS", "Stochastic_BuyS", "Buy_CCIS", "Buy_KAMAS", "Buy_CMFS",
+]
+ORIGINAL_SCORE_COLUMNS = SCORE_FLAG_COLUMNS + ["VSMA15"]
+
+# 0/1 signal columns (bit-packable), and every small-integer flag column
+SIGNAL_COLUMNS = [c for c in INDICATOR_COLUMNS
+                  if c == "Target_Cls" or (c.startswith(("Buy_", "Stochastic_Buy")) and c != "Buy_MACDS2")]
+FLAG_COLUMNS = SIGNAL_COLUMNS + ["Buy_MACDS2"]
+SIGNALS_BITMASK = "Signals"
+
+def compact_indicator_frame(df, bitmask=False, float_dtype=np.float32):
+    """
+    Memory-lean copy of an indicator frame: float32 indicator columns and int8 flags
+    (float_dtype=None keeps the floats as they are, so the copy is lossless).
+    With bitmask=True the 0/1 signal columns are packed into one uint32 'Signals'
+    column (bit i = SIGNAL_COLUMNS[i]). OHLCV columns keep their dtype.
+    The int8 layout works with the scoring and chart code as is; use
+    expand_indicator_frame to get the bitmask layout back to ordinary columns.
+    """
+    if df is None:
+        return None
+    out = df.copy()
+    for c in INDICATOR_COLUMNS:
+        if c not in out.columns:
+            continue
+        if c in FLAG_COLUMNS:
+            out[c] = out[c].astype(np.int8)
+        elif float_dtype is not None:
+            out[c] = out[c].astype(float_dtype)
+    if bitmask:
+        present = [c for c in SIGNAL_COLUMNS if c in out.columns]
+        bits = np.zeros(len(out), dtype=np.uint32)
+        for i, c in enumerate(SIGNAL_COLUMNS):
+            if c in present:
+                bits |= out[c].to_numpy().astype(np.uint32) << np.uint32(i)
+        out = out.drop(columns=present)
+        out[SIGNALS_BITMASK] = bits
+    return out
+
+def expand_indicator_frame(df, signals=None):
+    """
+    Inverse of compact_indicator_frame: float64 indicators and int64 flags in
+    calculate_all_indicators column order, with a 'Signals' bitmask unpacked into
+    its columns (all of them, or just `signals`).
+    """
+    if df is None:
+        return None
+    out = df.copy()
+    if SIGNALS_BITMASK in out.columns:
+        bits = out.pop(SIGNALS_BITMASK).to_numpy().astype(np.uint32)
+        for i, c in enumerate(SIGNAL_COLUMNS):
+            if signals is None or c in signals:
+                out[c] = ((bits >> np.uint32(i)) & 1).astype(np.int64)
+    # calculate_all_indicators order, also for frames whose columns were added piecemeal
+    base = [c for c in out.columns if c not in INDICATOR_COLUMNS]
+    out = out[base + [c for c in INDICATOR_COLUMNS if c in out.columns]]
+    for c in INDICATOR_COLUMNS:
+        if c in out.columns:
+            out[c] = out[c].astype(np.int64) if c in FLAG_COLUMNS else out[c].astype(np.float64)
+    return out
+
+# Indicator frames shared by all sessions, bounded by memory (least recently used evicted first)
+INDICATOR_CACHE_MB = float(os.getenv("BIST_INDICATOR_CACHE_MB", "256"))
+
+class IndicatorCache:
+    """
+    LRU cache of indicator frames keyed by (symbol, interval, last bar timestamp, bar
+    count, first and last bar OHLCV), so identical bars are never indicator-processed
+    twice — across reruns, sessions and scans — while a still-forming bar, or history
+    re-based by a split or dividend, misses. Frames are held in the lossless compact layout (float64 indicators, signals
+    packed into one bitmask word per bar) and grow columns on demand: a scan that
+    needs a few columns adds only those to a cached frame.
+    """
+    
+    def __init__(self, max_bytes):
+        import threading
+        from collections import OrderedDict
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()  # key -> (frame, nbytes)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(symbol, interval, df):
+        # The forming bar keeps its timestamp while its prices and volume change, and
+        # an adjustment re-bases the earlier bars while the last one stays the same
+        ends = df[[c for c in BAR_FIELDS if c in df.columns]].iloc[[0, -1]].to_numpy(dtype=np.float64).tobytes()
+        return (symbol, interval, pd.Timestamp(df.index[-1]).value, len(df), ends)
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return None
+            self._frames.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key, frame):
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._frames[key] = (frame, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, freed) = self._frames.popitem(last=False)
+                self.nbytes -= freed
+    
+    def indicators(self, symbol, interval, df, outputs=None):
+        """
+        compute_indicators(df, outputs) through the cache. Returns a private copy with
+        float64 indicators and int64 flags, whether it was a hit or a miss.
+        """
+        if df is None or df.empty:
+            return None
+        outputs = INDICATOR_COLUMNS if outputs is None else list(outputs)
+        key = self.key(symbol, interval, df)
+        frame = self.get(key)
+        if frame is not None:
+            held = set(frame.columns) | (set(SIGNAL_COLUMNS) if SIGNALS_BITMASK in frame.columns else set())
+            if all(c in held for c in outputs):
+                self.hits += 1
+                return expand_indicator_frame(frame)
+        self.misses += 1
+        base = expand_indicator_frame(frame) if frame is not None else df.copy()
+        frame = expand_indicator_frame(compute_indicators(base, outputs))
+        # The bitmask holds every signal or none: a partial frame keeps its int8 flag columns
+        packed = all(c in frame.columns for c in SIGNAL_COLUMNS)
+        self.put(key, compact_indicator_frame(frame, bitmask=packed, float_dtype=None))
+        return frame
+    
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+    
+    def stats(self):
+        return {"frames": len(self._frames), "mb": self.nbytes / 2**20,
+                "hits": self.hits, "misses": self.misses}
+
+@st.cache_resource
+def get_indicator_cache():
+    """Process-wide indicator cache shared by every session."""
+    return IndicatorCache(int(INDICATOR_CACHE_MB * 2**20))
+
+def cached_indicators(symbol, interval, df, outputs=None):
+    """calculate_all_indicators (or just `outputs`) for a fetched frame, via the shared cache."""
+    return get_indicator_cache().indicators(symbol, interval, df, outputs)
+
 def calculate_original_scores(df):
     if df is None or df.empty:
         return 0, 0
@@ -604,56 +1290,601 @@ def calculate_simplified_scores(df):
     vs = 5 if vr > 2 else 4 if vr > 1.5 else 3 if vr > 1.2 else 2 if vr > 0.8 else 1
     return round(score, 1), round(vs, 1)
 
-def screen_chosen_stocks(stock_list, interval="1d"):
-    chosen = []
-    prog = st.progress(0)
-    stat = st.empty()
+# =============================================================================
+# SIGNAL HISTORY - scores and sentiment for every bar, as arrays
+# =============================================================================
+
+SENTIMENT_LEVELS = ["STRONG BULLISH", "BULLISH", "NEUTRAL", "BEARISH", "STRONG BEARISH"]
+SENTIMENT_COLORS = ["#28a745", "#17a2b8", "#ffc107", "#fd7e14", "#dc3545"]
+
+def sentiment_points(ind_score, vol_score, rsi, macd_diff, price_change_pct):
+    """calculate_sentiment's score for arrays of any shape; NaN inputs score as in the scalar version."""
+    ind, vol, rsi, macd, chg = (np.asarray(x, dtype=float) for x in (ind_score, vol_score, rsi, macd_diff, price_change_pct))
+    with np.errstate(invalid="ignore"):
+        score = np.select([ind >= 6, ind >= 4, ind >= 2, ind >= 1], [4, 2, 0, -2], -4)
+        score += np.select([vol > 1.5, vol > 0.7, vol < 0.5], [2, 1, -1], 0)
+        score += np.select([rsi < 30, rsi < 40, rsi > 70, rsi > 60], [2, 1, -2, -1], 0)
+        score += np.where(macd > 0, 1, -1)
+        score += np.select([chg > 5, chg < -5], [1, -1], 0)
+    return score
+
+def sentiment_levels(score):
+    """Index into SENTIMENT_LEVELS for each score, with calculate_sentiment's cut-offs."""
+    return np.select([score >= 5, score >= 2, score >= -1, score >= -4], [0, 1, 2, 3], 4).astype(np.int8)
+
+def signal_history(df):
+    """
+    indicator_score_2, volume_score_2, sentiment and confidence for every bar of an
+    indicator frame — the values calculate_original_scores / calculate_sentiment give
+    for the last bar, computed for all bars at once. `chosen` marks bars that pass
+    the screener rule.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ind = df[SCORE_FLAG_COLUMNS].to_numpy(dtype=float).sum(axis=1)
+        vol = df["Volume"].to_numpy(dtype=float) / df["VSMA15"].to_numpy(dtype=float)
+        close = df["Close"].to_numpy(dtype=float)
+        chg = np.zeros(len(df))
+        chg[1:] = (close[1:] - close[:-1]) / close[:-1] * 100
+    score = sentiment_points(ind, vol, df["RSI"], df["Diff"], chg)
+    return pd.DataFrame({
+        "indicator_score_2": ind,
+        "volume_score_2": vol,
+        "sentiment_score": score,
+        "sentiment": pd.Categorical.from_codes(sentiment_levels(score), SENTIMENT_LEVELS),
+        "confidence": np.minimum(100, np.abs(score) / 10 * 100),
+        "chosen": (ind >= 3) & (vol > 0.7),
+    }, index=df.index)
+
+def panel_signal_history(panel, indicators):
+    """
+    signal_history for a whole MarketPanel: {name: (symbols × time) array} with
+    indicator_score_2, volume_score_2, sentiment_score, sentiment (index into
+    SENTIMENT_LEVELS, -1 where a symbol has no bar) and chosen.
+    """
+    valid = panel.valid
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ind = sum(np.nan_to_num(indicators[c]) for c in SCORE_FLAG_COLUMNS)
+        vol = panel.volume / indicators["VSMA15"]
+    chg = np.nan_to_num(indicators["Return_pct"] * 100)
+    score = sentiment_points(ind, vol, indicators["RSI"], indicators["Diff"], chg)
+    return {
+        "indicator_score_2": np.where(valid, ind, np.nan),
+        "volume_score_2": vol,
+        "sentiment_score": np.where(valid, score, 0),
+        "sentiment": np.where(valid, sentiment_levels(score), -1).astype(np.int8),
+        "chosen": valid & (ind >= 3) & (vol > 0.7),
+    }
+
+def create_signal_history_chart(hist):
+    """indicator_score_2 over time, coloured by sentiment, with the screener thresholds."""
+    from plotly.subplots import make_subplots
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=hist.index, y=hist["indicator_score_2"], mode='lines', line=dict(color='lightgray', width=1),
+                             name='Indicator 2', showlegend=False), secondary_y=False)
+    codes = hist["sentiment"].cat.codes.to_numpy()
+    for level, (label, color) in enumerate(zip(SENTIMENT_LEVELS, SENTIMENT_COLORS)):
+        sel = codes == level
+        if sel.any():
+            fig.add_trace(go.Scatter(x=hist.index[sel], y=hist["indicator_score_2"][sel], mode='markers',
+                                     marker=dict(color=color, size=6), name=label.title()), secondary_y=False)
+    chosen = hist[hist["chosen"]]
+    if not chosen.empty:
+        fig.add_trace(go.Scatter(x=chosen.index, y=chosen["indicator_score_2"] + 0.5, mode='markers',
+                                 marker=dict(symbol='star', color='gold', size=10), name='Chosen'), secondary_y=False)
+    fig.add_trace(go.Scatter(x=hist.index, y=hist["volume_score_2"], mode='lines', line=dict(color='blue', width=1, dash='dot'),
+                             name='Volume 2'), secondary_y=True)
+    fig.add_hline(y=3, line_dash="dash", line_color="green", annotation_text="Indicator ≥ 3")
+    fig.update_yaxes(title_text="Indicator score", secondary_y=False)
+    fig.update_yaxes(title_text="Volume score", secondary_y=True)
+    fig.update_layout(title="Signal History", height=300,
+                      margin=dict(l=40, r=20, t=40, b=70),
+                      legend=dict(orientation="h", yanchor="top", y=-0.2, xanchor="center", x=0.5, font=dict(size=10)))
+    return fig
+
+# =============================================================================
+# BACKTEST - the screener's "chosen stock" rule against forward returns
+# =============================================================================
+
+BACKTEST_HORIZONS = (1, 5, 10, 20)  # bars held after the signal bar's close
+
+def backtest_outcomes(panel, horizons=BACKTEST_HORIZONS):
+    """
+    Forward returns and drawdowns of every bar of a MarketPanel, independent of any
+    entry rule, so they can be shared by every rule evaluated on the same panel.
+    Arrays are right-packed per symbol (see _pack_right): "h bars later" is the
+    symbol's own h-th next bar.
+    """
+    rows, src, dst = _pack_right(panel.valid)
+    n_rows, n_steps = panel.valid.shape
+    def pack(a, fill):
+        out = np.full((n_rows, n_steps), fill, dtype=a.dtype)
+        out[rows, dst] = a[rows, src]
+        return out
+    close, low = pack(panel.close, np.nan), pack(panel.low, np.nan)
+    src_col = pack(np.broadcast_to(np.arange(n_steps), (n_rows, n_steps)), -1)
+    
+    fwd, dd = {}, {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for h in horizons:
+            fwd[h] = np.full((n_rows, n_steps), np.nan)
+            dd[h] = np.full((n_rows, n_steps), np.nan)
+            if h < n_steps:
+                fwd[h][:, :-h] = close[:, h:] / close[:, :-h] - 1
+                lowest = _rolling_apply(low, h, lambda w: w.min(axis=-1))
+                dd[h][:, :-h] = np.minimum(lowest[:, h:] / close[:, :-h] - 1, 0.0)
+    return {"pack": pack, "close": close, "src_col": src_col, "fwd": fwd, "dd": dd}
+
+def _rule_signals(panel, signals, ind_min, vol_min):
+    with np.errstate(invalid="ignore"):
+        return panel.valid & (signals["indicator_score_2"] >= ind_min) & (signals["volume_score_2"] > vol_min)
+
+def _backtest_summary(entry, outcomes):
+    """One summary row per horizon for a right-packed boolean entry mask."""
+    summary = []
+    for h, fwd in outcomes["fwd"].items():
+        done = entry & ~np.isnan(fwd)
+        r, d = fwd[done], outcomes["dd"][h][done]
+        base = fwd[~np.isnan(fwd)]
+        summary.append({
+            "horizon": h,
+            "signals": int(done.sum()),
+            "hit_rate_%": float((r > 0).mean() * 100) if len(r) else np.nan,
+            "avg_return_%": float(r.mean() * 100) if len(r) else np.nan,
+            "median_return_%": float(np.median(r) * 100) if len(r) else np.nan,
+            "baseline_avg_%": float(base.mean() * 100) if len(base) else np.nan,
+            "avg_drawdown_%": float(d.mean() * 100) if len(d) else np.nan,
+            "worst_drawdown_%": float(d.min() * 100) if len(d) else np.nan,
+        })
+    return pd.DataFrame(summary)
+
+def backtest_chosen_rule(panel, indicators=None, horizons=BACKTEST_HORIZONS, ind_min=3, vol_min=0.7,
+                         signals=None, outcomes=None):
+    """
+    Evaluate `indicator_score_2 >= ind_min and volume_score_2 > vol_min` on every bar
+    of every panel symbol, entering at the signal bar's close. For each horizon h
+    the forward return is close[t+h] / close[t] - 1 and the drawdown is the lowest
+    low of bars t+1..t+h against the entry close, both on the symbol's own bars.
+    `signals` may pass a precomputed panel_signal_history and `outcomes` a
+    precomputed backtest_outcomes (which then fixes the horizons).
+    
+    Returns (summary, trades): summary has one row per horizon (signal count, hit
+    rate, mean/median return, all-bar baseline, mean and worst drawdown); trades
+    lists every signal with its forward returns and drawdowns.
+    """
+    if indicators is None and signals is None:
+        indicators = compute_panel_indicators(panel)
+    if signals is None:
+        signals = panel_signal_history(panel, indicators)
+    if outcomes is None:
+        outcomes = backtest_outcomes(panel, horizons)
+    entry = outcomes["pack"](_rule_signals(panel, signals, ind_min, vol_min), False)
+    summary = _backtest_summary(entry, outcomes)
+    
+    trade_cols = {}
+    for h, fwd in outcomes["fwd"].items():
+        trade_cols[f"ret_{h}%"] = fwd[entry] * 100
+        trade_cols[f"dd_{h}%"] = outcomes["dd"][h][entry] * 100
+    r_idx, c_idx = np.nonzero(entry)
+    trades = pd.DataFrame({
+        "symbol": [panel.symbols[i] for i in r_idx],
+        "date": panel.dates[outcomes["src_col"][r_idx, c_idx]],
+        "close": outcomes["close"][r_idx, c_idx],
+        **trade_cols,
+    })
+    return summary, trades
+
+# =============================================================================
+# PARAMETER SWEEP - screener thresholds and indicator windows against the backtest
+# =============================================================================
+
+SWEEP_WORKERS = int(os.getenv("BIST_SWEEP_WORKERS", str(os.cpu_count() or 1)))  # batch CLI only, see iter_parameter_sweep
+SWEEP_THRESHOLDS = ("ind_min", "vol_min")
+
+# Keys are DEFAULT_INDICATOR_PARAMS names (or tuples of names swept together) plus
+# the screener thresholds; values are the candidates to try
+DEFAULT_SWEEP_GRID = {
+    "ind_min": (2, 3, 4, 5),
+    "vol_min": (0.5, 0.7, 1.0, 1.5),
+    "rsi_window": (9, 14, 21),
+    ("macd_fast", "macd_slow", "macd_sign"): ((12, 26, 9), (8, 21, 5)),
+    "sma_windows": ((5, 22, 50), (10, 20, 50)),
+    "vsma_window": (10, 15, 20),
+}
+
+_SWEEP_WORKER = {}  # panel/outcomes/cache of the sweep a worker process belongs to (set by its initializer)
+
+def expand_sweep_grid(grid=None):
+    """Every combination of a sweep grid as a flat {param: value} dict."""
+    import itertools
+    grid = DEFAULT_SWEEP_GRID if grid is None else grid
+    points = []
+    for combo in itertools.product(*grid.values()):
+        point = {}
+        for key, value in zip(grid.keys(), combo):
+            if isinstance(key, tuple):
+                point.update(zip(key, value))
+            else:
+                point[key] = value
+        points.append(point)
+    return points
+
+def _init_sweep_worker(panel, outcomes):
+    """Process-pool initializer: the sweep's panel and outcomes, inherited through fork."""
+    _SWEEP_WORKER.update(panel=panel, outcomes=outcomes, cache={})
+
+def _sweep_group(params, thresholds, ctx=None):
+    """
+    Score every (ind_min, vol_min) pair for one set of indicator params. Indicators
+    and signal history are computed once per group; the per-sweep cache keeps
+    intermediates (EMAs, RSI, SMAs...) for later groups that share a window.
+    `ctx` is the sweep's {panel, outcomes, cache}; pool workers use their own.
+    """
+    ctx = _SWEEP_WORKER if ctx is None else ctx
+    cache = ctx["cache"]
+    panel, outcomes = ctx["panel"], ctx["outcomes"]
+    signals = panel_signal_history(panel, compute_panel_indicators(panel, params, cache=cache))
+    rows = []
+    for ind_min, vol_min in thresholds:
+        entry = outcomes["pack"](_rule_signals(panel, signals, ind_min, vol_min), False)
+        summary = _backtest_summary(entry, outcomes)
+        row = {"ind_min": ind_min, "vol_min": vol_min, **params, "signals": int(entry.sum())}
+        for rec in summary.to_dict("records"):
+            h = rec["horizon"]
+            row[f"hit_{h}%"] = rec["hit_rate_%"]
+            row[f"avg_{h}%"] = rec["avg_return_%"]
+            row[f"dd_{h}%"] = rec["avg_drawdown_%"]
+        rows.append(row)
+    return rows
+
+def iter_parameter_sweep(panel, grid=None, horizons=BACKTEST_HORIZONS, workers=None):
+    """
+    Backtest every point of a sweep grid on a MarketPanel, yielding result rows
+    (params + signal count + hit rate / average return / average drawdown per
+    horizon) as they finish.
+    
+    Grid points are grouped by indicator params so each group computes indicators
+    once and only re-thresholds for ind_min/vol_min; forward outcomes are computed
+    once for the whole sweep. Groups run in-process unless start_cpu_pool has run
+    (the batch CLI): only then is the process known to have forked cleanly, and the
+    groups go to a fork-context pool of the sweep's own, whose initializer hands the
+    panel to the workers without pickling. The Streamlit server never forks from its
+    threads. Closing the generator stops the sweep and cancels the groups still queued.
+    """
+    groups = {}
+    for point in expand_sweep_grid(grid):
+        params = {k: v for k, v in point.items() if k not in SWEEP_THRESHOLDS}
+        key = tuple(sorted(params.items()))
+        groups.setdefault(key, (params, []))[1].append(
+            (point.get("ind_min", 3), point.get("vol_min", 0.7)))
+    
+    import multiprocessing
+    workers = max(1, min(int(workers or SWEEP_WORKERS), len(groups)))
+    outcomes = backtest_outcomes(panel, horizons)
+    if workers == 1 or _CPU_POOL is None or "fork" not in multiprocessing.get_all_start_methods():
+        ctx = {"panel": panel, "outcomes": outcomes, "cache": {}}
+        for params, thresholds in groups.values():
+            yield from _sweep_group(params, thresholds, ctx)
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                               initializer=_init_sweep_worker, initargs=(panel, outcomes))
+    try:
+        futures = [pool.submit(_sweep_group, params, thresholds) for params, thresholds in groups.values()]
+        for fut in as_completed(futures):
+            yield from fut.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _attach_script_ctx(ctx):
+    """Thread-pool initializer: give worker threads the caller's Streamlit script context."""
+    if ctx is not None and add_script_run_ctx is not None:
+        import threading
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+def iter_symbol_pool(symbols, task, workers=None, timeout=None, cancel_event=None):
+    """
+    Run task(symbol) for every symbol on a bounded thread pool.
+    Yields (index, symbol, result) as each task finishes. A task that raises, or is
+    still running `timeout` seconds after it started, yields None as its result.
+    Setting cancel_event stops the iteration and drops all queued symbols.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    
+    symbols = list(symbols)
+    workers = max(1, int(workers or FETCH_WORKERS))
+    timeout = FETCH_TIMEOUT if timeout is None else timeout
+    started = {}  # index -> monotonic start time (set by the worker thread)
+    
+    def _run(i, s):
+        started[i] = time.monotonic()
+        return task(s)
+    
+    ctx = get_script_run_ctx() if get_script_run_ctx is not None else None
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bist-scan",
+                                  initializer=_attach_script_ctx, initargs=(ctx,))
+    pending = {executor.submit(_run, i, s): i for i, s in enumerate(symbols)}
+    try:
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            done, _ = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception:
+                    result = None
+                yield i, symbols[i], result
+            if timeout:
+                # Give up on symbols that hang; the thread finishes in the background
+                now = time.monotonic()
+                for fut, i in list(pending.items()):
+                    if i in started and now - started[i] > timeout and not fut.done():
+                        pending.pop(fut)
+                        yield i, symbols[i], None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def run_symbol_pool(symbols, task, workers=None, timeout=None, progress=None):
+    """
+    Run task(symbol) for every symbol concurrently and return the results in the
+    same order as `symbols` (None for failed or timed-out symbols).
+    progress(done, total, symbol) is called from the calling thread as results arrive.
+    """
+    symbols = list(symbols)
+    results = [None] * len(symbols)
+    for done, (i, s, result) in enumerate(iter_symbol_pool(symbols, task, workers, timeout), start=1):
+        results[i] = result
+        if progress is not None:
+            progress(done, len(symbols), s)
+    return results
+
+def _screen_symbol(s, start_date, interval, allow_live=False, errors=None, last_bars=None):
+    """
+    Fetch and score one symbol for the screener. Returns its result row, or None if not
+    chosen; symbols without bars are also appended to `errors` when a list is given,
+    and the timestamp of its latest bar is stored in a `last_bars` dict.
+    """
+    df = fetch_stock_data(s, start_date=start_date, interval=interval)
+    if df is None or df.empty:
+        if errors is not None:
+            errors.append(s)
+        return None
+    if last_bars is not None:
+        last_bars[s] = df.index[-1]
+    if BAR_STORE_ENABLED and interval in STREAMING_INTERVALS:
+        # Intraday: advance the persisted indicator state by the newly closed bars only
+        latest = streaming_indicator_row(s, interval, df)
+        if latest is None:
+            return None
+        ind = float(sum(latest[c] for c in SCORE_FLAG_COLUMNS))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            vol = float(np.float64(latest['Volume']) / np.float64(latest['VSMA15']))
+        prev_close = latest['Close'] - latest['Return']
+    else:
+        df = cached_indicators(s, interval, df, ORIGINAL_SCORE_COLUMNS + ["RSI"])
+        ind, vol = calculate_original_scores(df)
+        latest = df.iloc[-1]
+        prev_close = df['Close'].iloc[-2] if len(df) > 1 else latest['Close']
+    if not (ind >= 3 and vol > 0.7):
+        return None
+    price = latest['Close']
+    row = _screener_row(s, price, prev_close, len(df) > 1, latest.get('RSI', None), ind, vol)
+    trend = compute_kernels(df[BAR_FIELDS].copy(), SCREENER_KERNELS).iloc[-1]
+    _set_trend_columns(row, trend['ADX'], trend['SuperTrend_Dir'])
+    # Add valuations if financial data available (imported store only, unless allow_live)
+    _set_valuation_columns(row, compute_stock_valuations(s, price, allow_live=allow_live))
+    return row
+
+def _screener_row(s, price, prev_close, has_prev, rsi, ind, vol):
+    """Result row of a chosen stock (without the trend and valuation columns)."""
+    price_chg = ((price - prev_close) / prev_close) * 100 if has_prev else 0
+    return {
+        'symbol': s,
+        'price': round(price, 2),
+        'chg%': round(price_chg, 2),
+        'RSI': round(rsi, 1) if rsi and pd.notna(rsi) else None,
+        'indicator_score_2': round(ind, 2),
+        'volume_score_2': round(vol, 2),
+    }
+
+# Trend context of a chosen stock, from the indicator kernels
+SCREENER_KERNELS = ["ADX", "SuperTrend"]
+
+def _set_trend_columns(row, adx, direction):
+    row['ADX'] = round(float(adx), 1) if pd.notna(adx) else None
+    row['Trend'] = "▲" if direction > 0 else "▼" if direction < 0 else None
+
+# Every column of a screener row, in display order
+SCREENER_COLUMNS = ['symbol', 'price', 'chg%', 'RSI', 'indicator_score_2', 'volume_score_2', 'ADX', 'Trend',
+                    'P/E', 'PD/DD', 'EV/EBITDA', 'Fwd P/E', 'Fwd PD/DD', 'Fwd EV/EBITDA', 'P/E Δ', 'EV/EBITDA Δ']
+
+def _screen_panel(panel, indicators, allow_live=False, workers=None):
+    """_screen_symbol for every panel symbol at once, from panel indicators."""
+    ind = sum(panel.latest(indicators[c]) for c in SCORE_FLAG_COLUMNS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vol = panel.latest(panel.volume) / panel.latest(indicators["VSMA15"])
+    close = panel.latest(panel.close)
+    prev_close = panel.latest(panel.close, offset=1)
+    rsi = panel.latest(indicators["RSI"])
+    n_bars = panel.valid.sum(axis=1)
+    rows = [
+        _screener_row(s, float(close[i]), float(prev_close[i]), n_bars[i] > 1, float(rsi[i]), float(ind[i]), float(vol[i]))
+        for i, s in enumerate(panel.symbols) if n_bars[i] and ind[i] >= 3 and vol[i] > 0.7
+    ]
+    if rows:
+        trend = kernel_snapshot(panel.select([row['symbol'] for row in rows]), SCREENER_KERNELS)
+        for row in rows:
+            _set_trend_columns(row, trend.at[row['symbol'], 'ADX'], trend.at[row['symbol'], 'SuperTrend_Dir'])
+    prices = {s: float(close[i]) for i, s in enumerate(panel.symbols)}
+    if allow_live:
+        vals = run_symbol_pool([row['symbol'] for row in rows],
+                               lambda s: compute_stock_valuations(s, prices[s], allow_live=True), workers=workers)
+    else:
+        vals = [compute_stock_valuations(row['symbol'], prices[row['symbol']], allow_live=False) for row in rows]
+    for row, v in zip(rows, vals):
+        _set_valuation_columns(row, v or {})
+    return rows
+
+def _set_valuation_columns(row, vals):
+    row['P/E'] = vals.get('pe')
+    row['PD/DD'] = vals.get('pb')
+    row['EV/EBITDA'] = vals.get('ev_ebitda')
+    row['Fwd P/E'] = vals.get('fwd_pe')
+    row['Fwd PD/DD'] = vals.get('fwd_pb')
+    row['Fwd EV/EBITDA'] = vals.get('fwd_ev_ebitda')
+    row['P/E Δ'] = vals.get('pe_delta')
+    row['EV/EBITDA Δ'] = vals.get('ev_ebitda_delta')
+
+def screen_chosen_stocks(stock_list, interval="1d", workers=None, allow_live=False, progress=None, errors=None,
+                         last_bars=None):
+    """
+    Technical screen of stock_list. Valuation columns come from the imported financial
+    store only, so the scan never waits on the İş Yatırım API; pass allow_live=True to
+    fetch missing financials inline, or fill them in later with enrich_screener_valuations.
+    `progress(done, total, symbol)` replaces the Streamlit progress bar (background scans).
+    Symbols whose bars could not be loaded are appended to `errors` when a list is given;
+    a `last_bars` dict receives each loaded symbol's latest bar timestamp.
+    """
+    stock_list = list(stock_list)
+    show = progress is None
     days = TIMEFRAMES[interval]["days"]
     start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-    for i, s in enumerate(stock_list):
-        stat.text(f"Screening {s}... ({i+1}/{len(stock_list)})")
-        prog.progress((i + 1) / len(stock_list))
-        try:
-            df = fetch_stock_data(s, start_date=start_date, interval=interval)
-            if df is not None and not df.empty:
-                df = calculate_all_indicators(df)
-                ind, vol = calculate_original_scores(df)
-                if ind >= 3 and vol > 0.7:
-                    latest = df.iloc[-1]
-                    prev = df.iloc[-2] if len(df) > 1 else latest
-                    price = latest['Close']
-                    price_chg = ((price - prev['Close']) / prev['Close']) * 100 if len(df) > 1 else 0
-                    rsi = latest.get('RSI', None)
-                    
-                    row = {
-                        'symbol': s,
-                        'price': round(price, 2),
-                        'chg%': round(price_chg, 2),
-                        'RSI': round(rsi, 1) if rsi and pd.notna(rsi) else None,
-                        'indicator_score_2': round(ind, 2),
-                        'volume_score_2': round(vol, 2),
-                    }
-                    
-                    # Add valuations if financial data available
-                    vals = compute_stock_valuations(s, price)
-                    row['P/E'] = vals.get('pe')
-                    row['PD/DD'] = vals.get('pb')
-                    row['EV/EBITDA'] = vals.get('ev_ebitda')
-                    row['Fwd P/E'] = vals.get('fwd_pe')
-                    row['Fwd PD/DD'] = vals.get('fwd_pb')
-                    row['Fwd EV/EBITDA'] = vals.get('fwd_ev_ebitda')
-                    row['P/E Δ'] = vals.get('pe_delta')
-                    row['EV/EBITDA Δ'] = vals.get('ev_ebitda_delta')
-                    
-                    chosen.append(row)
-        except:
+    if show:
+        prog = st.progress(0)
+        stat = st.empty()
+        
+        def progress(done, total, s):
+            stat.text(f"Screened {s} ({done}/{total})")
+            prog.progress(done / total)
+    
+    if BAR_STORE_ENABLED and interval in STREAMING_INTERVALS:
+        # Intraday: per-symbol incremental indicator state, cheap enough for threads
+        rows = run_symbol_pool(stock_list, lambda s: _screen_symbol(s, start_date, interval, allow_live, errors, last_bars),
+                               workers=workers, progress=progress)
+        chosen = [row for row in rows if row is not None]
+    else:
+        # Fetch on the thread pool, then compute indicators for all symbols on the process pool
+        panel = MarketPanel.load(stock_list, interval, start_date=start_date, workers=workers, progress=progress)
+        chosen = _screen_panel(panel, parallel_panel_indicators(panel), allow_live, workers) if panel is not None else []
+        if errors is not None:
+            errors.extend(s for s in stock_list if panel is None or s not in panel)
+        if last_bars is not None and panel is not None:
+            last_bars.update(panel.last_bar_times())
+    if show:
+        prog.empty()
+        stat.empty()
+    return chosen
+
+def iter_screen_chosen_stocks(stock_list, interval="1d", workers=None, allow_live=False, cancel_event=None,
+                              errors=None, last_bars=None):
+    """
+    screen_chosen_stocks as a stream: yields (symbol, row) as each symbol is scored,
+    with row None when the symbol does not qualify or failed (failed ones are also
+    appended to `errors`, latest bar timestamps go to `last_bars`). Setting
+    cancel_event, or closing the generator, drops every symbol still queued.
+    """
+    days = TIMEFRAMES[interval]["days"]
+    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    results = iter_symbol_pool(stock_list, lambda s: _screen_symbol(s, start_date, interval, allow_live, errors, last_bars),
+                               workers=workers, cancel_event=cancel_event)
+    try:
+        for _, s, row in results:
+            yield s, row
+    finally:
+        results.close()
+
+def scan_timeframe_confluence(stock_list, intervals, workers=None, progress=None):
+    """
+    Evaluate the chosen-stock rule on several timeframes in one scan.
+    
+    Each symbol is fetched once per base interval (1wk comes from 1d, 4h from 1h,
+    15m/30m from 5m, see RESAMPLE_SOURCES) and coarser intervals are resampled
+    locally; every interval is then scored for all symbols in one
+    compute_panel_indicators pass. Returns a DataFrame indexed by symbol with, per
+    interval, `ind <tf>`, `vol <tf>` and a chosen flag `<tf>`, plus `confluence`
+    (the number of intervals the symbol is chosen on), best first.
+    """
+    intervals = list(intervals)
+    stock_list = list(stock_list)
+    now = datetime.now()
+    starts = {}
+    for iv in intervals:
+        start = now - timedelta(days=TIMEFRAMES[iv]["days"])
+        if iv == "1wk":
+            start -= timedelta(days=start.weekday())  # whole first week, as fetch_resampled
+        starts[iv] = pd.Timestamp(start.strftime("%Y-%m-%d"))
+    bases = {}
+    for iv in intervals:
+        base = RESAMPLE_SOURCES.get(iv, iv)
+        bases[base] = min(bases.get(base, starts[iv]), starts[iv])
+    
+    def fetch(s):
+        return {base: fetch_stock_data(s, start_date=start.strftime("%Y-%m-%d"), interval=base)
+                for base, start in bases.items()}
+    fetched = run_symbol_pool(stock_list, fetch, workers=workers, progress=progress)
+    
+    out = pd.DataFrame(index=pd.Index(stock_list, name="symbol"))
+    for iv in intervals:
+        base = RESAMPLE_SOURCES.get(iv, iv)
+        cutoff = starts[iv].tz_localize(BAR_TZ)
+        frames = {}
+        for s, data in zip(stock_list, fetched):
+            df = (data or {}).get(base)
+            if df is None or df.empty:
+                continue
+            if iv != base:
+                df = resample_bars(df[BAR_FIELDS], iv)
+            frames[s] = df[df.index >= cutoff]
+        out[f"ind {iv}"], out[f"vol {iv}"], out[iv] = np.nan, np.nan, False
+        panel = MarketPanel.from_frames(frames)
+        if panel is None:
             continue
+        indicators = compute_panel_indicators(panel)
+        ind = sum(panel.latest(indicators[c]) for c in SCORE_FLAG_COLUMNS)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            vol = panel.latest(panel.volume) / panel.latest(indicators["VSMA15"])
+            chosen = (ind >= 3) & (vol > 0.7)
+        out.loc[panel.symbols, f"ind {iv}"] = ind
+        out.loc[panel.symbols, f"vol {iv}"] = vol
+        out.loc[panel.symbols, iv] = chosen
+    out["confluence"] = out[intervals].sum(axis=1).astype(int)
+    sort_by = ["confluence"] + [f"ind {iv}" for iv in intervals]
+    return out.sort_values(sort_by, ascending=False)
+
+def enrich_screener_valuations(rows, workers=None):
+    """
+    Fill the valuation columns of screener rows that have none, fetching missing
+    financials live. Rows are updated in place as each symbol arrives.
+    Returns the number of rows that gained valuations.
+    """
+    missing = [row for row in rows if row.get('P/E') is None and row.get('PD/DD') is None]
+    if not missing:
+        return 0
+    by_symbol = {row['symbol']: row for row in missing}
+    prog = st.progress(0)
+    stat = st.empty()
+    filled = 0
+    results = iter_symbol_pool(list(by_symbol), lambda s: compute_stock_valuations(s, by_symbol[s]['price']),
+                               workers=workers or IMPORT_WORKERS, timeout=0)
+    for done, (_, s, vals) in enumerate(results, start=1):
+        stat.text(f"Fetched financials for {s} ({done}/{len(by_symbol)})")
+        prog.progress(done / len(by_symbol))
+        if vals:
+            _set_valuation_columns(by_symbol[s], vals)
+            filled += 1
     prog.empty()
     stat.empty()
-    return chosen
+    return filled
 
-def scan_market_summary(stock_list, interval="1d"):
-    """Scan all stocks and return sentiment distribution + SMA50 stats."""
+def scan_market_summary(stock_list, interval="1d", workers=None, progress=None, last_bars=None):
+    """
+    Scan all stocks and return sentiment distribution + SMA50 stats.
+    `progress(done, total, symbol)` replaces the Streamlit progress bar (background scans);
+    a `last_bars` dict receives each loaded symbol's latest bar timestamp.
+    """
     sentiment_counts = {
         "STRONG BULLISH": [], "BULLISH": [], "NEUTRAL": [],
         "BEARISH": [], "STRONG BEARISH": [], "ERROR": []
@@ -662,47 +1893,1298 @@ def scan_market_summary(stock_list, interval="1d"):
     below_sma50 = []
     sma50_na = []
     
-    prog = st.progress(0)
-    stat = st.empty()
+    show = progress is None
     days = TIMEFRAMES[interval]["days"]
     start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    if show:
+        prog = st.progress(0)
+        stat = st.empty()
+        
+        def progress(done, total, s):
+            stat.text(f"Scanned {s} ({done}/{total})")
+            prog.progress(done / total)
+    
+    # Fetch on the thread pool, then score every symbol in one vectorized pass
+    stock_list = list(stock_list)
+    panel = MarketPanel.load(stock_list, interval, start_date=start_date, workers=workers, progress=progress)
+    results = summarize_panel(panel, parallel_panel_indicators(panel)) if panel is not None else {}
+    if last_bars is not None and panel is not None:
+        last_bars.update(panel.last_bar_times())
+    for s in stock_list:
+        result = results.get(s)
+        if result is None:
+            sentiment_counts["ERROR"].append(s)
+            sma50_na.append(s)
+            continue
+        sentiment_text, above = result
+        sentiment_counts[sentiment_text].append(s)
+        if above is None:
+            sma50_na.append(s)
+        elif above:
+            above_sma50.append(s)
+        else:
+            below_sma50.append(s)
     
-    for i, s in enumerate(stock_list):
-        stat.text(f"Scanning {s}... ({i+1}/{len(stock_list)})")
-        prog.progress((i + 1) / len(stock_list))
+    if show:
+        prog.empty()
+        stat.empty()
+    return sentiment_counts, above_sma50, below_sma50, sma50_na
+
+# =============================================================================
+# SCHEDULED SCANS - one background market scan per bar close, shared by every session
+# =============================================================================
+
+SCAN_SCHEDULER_ENABLED = os.getenv("BIST_SCAN_SCHEDULER", "1") != "0"
+# Timeframes scanned in the background (intraday ones also need TradingView auth)
+SCAN_SCHEDULE_INTERVALS = [tf.strip() for tf in os.getenv("BIST_SCAN_INTERVALS", "1d").split(",") if tf.strip() in TIMEFRAMES]
+SCAN_SETTLE_SECONDS = float(os.getenv("BIST_SCAN_SETTLE", "120"))  # let the feed publish a closed bar
+# Bars closing at 18:00 (daily, weekly, the last intraday bar) only settle after the
+# closing auction (to ~18:10) has printed through the 15-minute delayed feed
+SCAN_CLOSE_SETTLE_SECONDS = float(os.getenv("BIST_SCAN_CLOSE_SETTLE", "1800"))
+SCAN_MAX_ERROR_SHARE = float(os.getenv("BIST_SCAN_MAX_ERRORS", "0.5"))  # scans with more failed symbols are not shared
+SCAN_POLL_SECONDS = 60
+SCAN_MAX_BACKOFF_SECONDS = float(os.getenv("BIST_SCAN_MAX_BACKOFF", "3600"))  # retry delay cap after failed scans
+SCAN_KINDS = ("chosen", "market_summary")
+
+def last_bar_close(interval, now=None):
+    """
+    Most recent bar close for `interval` at or before `now`: intraday bars close on
+    the session grid from the 10:00 open up to the 18:00 close, daily bars at the
+    close and weekly bars at Friday's close. Weekends are skipped (not holidays).
+    """
+    now = pd.Timestamp.now(tz=BAR_TZ) if now is None else pd.Timestamp(now).tz_convert(BAR_TZ)
+    day = now.normalize()
+    for _ in range(10):
+        if day.weekday() < 5:
+            close = day + BIST_SESSION_CLOSE
+            if interval == "1wk":
+                closes = [close] if day.weekday() == 4 else []
+            elif interval == "1d":
+                closes = [close]
+            else:
+                step = pd.Timedelta(seconds=BAR_SECONDS[interval])
+                closes = list(pd.date_range(day + BIST_SESSION_OPEN + step, close, freq=step))
+                if not closes or closes[-1] < close:
+                    closes.append(close)
+            past = [c for c in closes if c <= now]
+            if past:
+                return past[-1]
+        day -= pd.Timedelta(days=1)
+    return None
+
+def bar_close_time(label, interval):
+    """Close of the bar labelled `label` (bars are labelled with their start, on the grid of last_bar_close)."""
+    label = pd.Timestamp(label)
+    label = label.tz_localize(BAR_TZ) if label.tz is None else label.tz_convert(BAR_TZ)
+    day = label.normalize()
+    if interval == "1wk":
+        return day + pd.Timedelta(days=4 - day.weekday()) + BIST_SESSION_CLOSE
+    if interval == "1d":
+        return day + BIST_SESSION_CLOSE
+    return min(label + pd.Timedelta(seconds=BAR_SECONDS[interval]), day + BIST_SESSION_CLOSE)
+
+def run_market_summary(stock_list, interval="1d", workers=None, progress=None, last_bars=None):
+    """scan_market_summary as the record kept in st.session_state.market_summary."""
+    sentiment_counts, above_sma50, below_sma50, sma50_na = scan_market_summary(
+        stock_list, interval=interval, workers=workers, progress=progress, last_bars=last_bars)
+    return {
+        'sentiment': sentiment_counts,
+        'above_sma50': above_sma50,
+        'below_sma50': below_sma50,
+        'sma50_na': sma50_na,
+        'scan_time': datetime.now().strftime("%Y-%m-%d %H:%M")
+    }
+
+class ScanScheduler:
+    """
+    Runs the screener and the market summary for each scheduled timeframe once per
+    bar close on a background thread, and keeps the latest results as versioned
+    snapshots {version, bar_close, scan_time, data} per (interval, kind) that every
+    session reads. Scans a session runs itself are published here too. Scans where
+    most symbols failed to load or only have stored bars from before the due close
+    (an outage) are never published; the next attempt then backs off exponentially.
+    """
+    
+    def __init__(self, intervals, symbols):
+        import threading
+        self.intervals = list(intervals)
+        self.symbols = list(symbols)
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._version = 0
+        self._running = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self.last_error = None
+    
+    def start(self):
+        import threading
+        if self._thread is None and self.intervals:
+            self._thread = threading.Thread(target=self._loop, name="bist-scan-scheduler", daemon=True)
+            self._thread.start()
+        return self
+    
+    def publish(self, interval, kind, bar_close, data):
+        """Store a snapshot unless a newer bar is already published. Returns the snapshot's version."""
+        with self._lock:
+            prev = self._snapshots.get((interval, kind))
+            if prev and prev["bar_close"] is not None and bar_close is not None and bar_close < prev["bar_close"]:
+                return prev["version"]
+            self._version += 1
+            self._snapshots[(interval, kind)] = {
+                "version": self._version,
+                "bar_close": bar_close,
+                "scan_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                "data": data,
+            }
+            return self._version
+    
+    @staticmethod
+    def scan_failures(interval, bar_close, errors, last_bars):
+        """Symbols that failed to load plus those whose latest bar closes before bar_close (stale stored bars)."""
+        stale = {s for s, ts in last_bars.items()
+                 if bar_close is not None and bar_close_time(ts, interval) < bar_close}
+        return set(errors) | stale
+    
+    def publish_scan(self, interval, kind, bar_close, data, errors, total, last_bars):
+        """
+        publish() a scan meant to cover the bar closing at bar_close, stamped with the
+        latest bar close its data actually reaches (`last_bars`: symbol -> latest bar
+        timestamp; bars after bar_close are still forming). Refused when that is older
+        than bar_close, or when more than SCAN_MAX_ERROR_SHARE of its `total` symbols
+        failed or are stale. Returns the version or None.
+        """
+        closes = [bar_close_time(ts, interval) for ts in last_bars.values()]
+        data_bar = max(closes) if closes else None
+        if data_bar is not None and bar_close is not None:
+            data_bar = min(data_bar, bar_close)
+        if data_bar is None or (bar_close is not None and data_bar < bar_close):
+            self.last_error = (f"{interval} {kind}: no bars up to the {bar_close:%d.%m %H:%M} close"
+                               f"{f' (latest {data_bar:%d.%m %H:%M})' if data_bar is not None else ''}, not published")
+            return None
+        failed = self.scan_failures(interval, bar_close, errors, last_bars)
+        if total and len(failed) > SCAN_MAX_ERROR_SHARE * total:
+            self.last_error = f"{interval} {kind}: {len(failed)}/{total} symbols failed to load or are stale, not published"
+            return None
+        return self.publish(interval, kind, data_bar, data)
+    
+    def discard(self, interval=None):
+        """Drop the snapshots of `interval` (all if None) so the next scan runs instead of replaying them."""
+        with self._lock:
+            for key in [k for k in self._snapshots if interval is None or k[0] == interval]:
+                del self._snapshots[key]
+    
+    def snapshot(self, interval, kind):
+        with self._lock:
+            return self._snapshots.get((interval, kind))
+    
+    def snapshots(self):
+        with self._lock:
+            return dict(self._snapshots)
+    
+    @staticmethod
+    def due_bar(interval):
+        """Latest bar close a scan should cover now (closes younger than the settle time wait)."""
+        now = pd.Timestamp.now(tz=BAR_TZ)
+        bar = last_bar_close(interval, now - pd.Timedelta(seconds=SCAN_SETTLE_SECONDS))
+        if bar is not None and bar - bar.normalize() == BIST_SESSION_CLOSE and now - bar < pd.Timedelta(seconds=SCAN_CLOSE_SETTLE_SECONDS):
+            bar = last_bar_close(interval, bar - pd.Timedelta(seconds=1))  # the session close has not settled yet
+        return bar
+    
+    def fresh(self, interval, kind):
+        """The snapshot if it already covers the latest closed bar, else None."""
+        snap = self.snapshot(interval, kind)
+        due = self.due_bar(interval)
+        if snap and snap["bar_close"] is not None and due is not None and snap["bar_close"] >= due:
+            return snap
+        return None
+    
+    def is_running(self, interval):
+        with self._lock:
+            return interval in self._running
+    
+    def _scan(self, interval):
+        if TIMEFRAMES[interval]["auth_required"] and not setup_tradingview_auth()[0]:
+            return
+        bar_close = self.due_bar(interval)
+        quiet = lambda done, total, s: None
+        with self._lock:
+            self._running.add(interval)
         try:
-            df = fetch_stock_data(s, start_date=start_date, interval=interval)
-            if df is None or df.empty:
-                sentiment_counts["ERROR"].append(s)
-                sma50_na.append(s)
-                continue
-            df = calculate_all_indicators(df)
-            ind2, vol2 = calculate_original_scores(df)
-            latest = df.iloc[-1]
-            prev = df.iloc[-2] if len(df) > 1 else latest
-            price_change_pct = ((latest['Close'] - prev['Close']) / prev['Close']) * 100 if len(df) > 1 else 0
-            
-            sentiment_text, _, _, confidence = calculate_sentiment(
-                ind2, vol2, latest['RSI'], latest['Diff'], price_change_pct
+            self.last_error = None
+            if not self.fresh(interval, "chosen"):
+                errors, last_bars = [], {}
+                rows = screen_chosen_stocks(self.symbols, interval, progress=quiet, errors=errors, last_bars=last_bars)
+                self.publish_scan(interval, "chosen", bar_close, rows, errors, len(self.symbols), last_bars)
+            if not self.fresh(interval, "market_summary"):
+                last_bars = {}
+                summary = run_market_summary(self.symbols, interval, progress=quiet, last_bars=last_bars)
+                self.publish_scan(interval, "market_summary", bar_close, summary,
+                                  summary['sentiment']['ERROR'], len(self.symbols), last_bars)
+        except Exception as e:
+            self.last_error = f"{interval}: {e}"
+        finally:
+            with self._lock:
+                self._running.discard(interval)
+    
+    def _loop(self):
+        import time
+        backoff = {}  # interval -> (due bar, failed scans in a row, monotonic time of the next attempt)
+        while True:
+            for interval in self.intervals:
+                if all(self.fresh(interval, kind) for kind in SCAN_KINDS):
+                    backoff.pop(interval, None)
+                    continue
+                due = self.due_bar(interval)
+                failed_due, failures, retry_at = backoff.get(interval, (None, 0, 0.0))
+                if failed_due != due:
+                    failures = 0  # a new bar close is due: try it right away
+                elif time.monotonic() < retry_at:
+                    continue
+                self._scan(interval)
+                if all(self.fresh(interval, kind) for kind in SCAN_KINDS):
+                    backoff.pop(interval, None)
+                else:
+                    delay = min(SCAN_POLL_SECONDS * 2 ** (failures + 1), SCAN_MAX_BACKOFF_SECONDS)
+                    backoff[interval] = (due, failures + 1, time.monotonic() + delay)
+            self._wake.wait(SCAN_POLL_SECONDS)
+            self._wake.clear()
+
+@st.cache_resource
+def get_scan_scheduler():
+    """Process-wide scan scheduler; its thread starts with the first session."""
+    scheduler = ScanScheduler(SCAN_SCHEDULE_INTERVALS if SCAN_SCHEDULER_ENABLED else [], IMKB)
+    return scheduler.start()
+
+def sync_scan_snapshots(scheduler):
+    """
+    Copy shared snapshots newer than this session's results into session_state.
+    Chosen stocks whose valuations this session fetched on demand (see
+    enrich_screener_valuations) are re-valued at the snapshot's price.
+    """
+    import copy
+    seen = st.session_state.scan_snapshot_versions
+    for (interval, kind), snap in scheduler.snapshots().items():
+        if seen.get((interval, kind), 0) < snap["version"]:
+            target = st.session_state.chosen_stocks if kind == "chosen" else st.session_state.market_summary
+            data = copy.deepcopy(snap["data"])  # sessions edit their rows in place
+            if kind == "chosen":
+                enriched = {row['symbol'] for row in target.get(interval) or []
+                            if row.get('P/E') is not None or row.get('PD/DD') is not None}
+                for row in data:
+                    if row['symbol'] in enriched and row.get('P/E') is None and row.get('PD/DD') is None:
+                        vals = compute_stock_valuations(row['symbol'], row['price'])  # financials already fetched
+                        if vals:
+                            _set_valuation_columns(row, vals)
+            target[interval] = data
+            seen[(interval, kind)] = snap["version"]
+
+# =============================================================================
+# MARKET PANEL - aligned multi-symbol OHLCV arrays for cross-sectional work
+# =============================================================================
+
+def _rolling_sum(x, window):
+    """
+    Rolling sum along the time axis of a 2D (symbols × time) array.
+    Returns (sums, counts) where counts is the number of non-NaN values in each window.
+    """
+    valid = ~np.isnan(x)
+    cs = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    cn = np.cumsum(valid, axis=1)
+    sums = cs.copy()
+    counts = cn.copy()
+    sums[:, window:] = cs[:, window:] - cs[:, :-window]
+    counts[:, window:] = cn[:, window:] - cn[:, :-window]
+    return sums, counts
+
+def _rolling_mean(x, window, min_periods=None):
+    """Rolling mean along the time axis; NaN until a window holds min_periods (default: window) values."""
+    sums, counts = _rolling_sum(x, window)
+    min_periods = window if min_periods is None else min_periods
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = sums / counts
+    out[(counts < max(min_periods, 1))] = np.nan
+    return out
+
+
+class MarketPanel:
+    """
+    OHLCV history for many symbols held as aligned NumPy arrays.
+    
+    values has shape (symbols, time, field) with fields in BAR_FIELDS order, on one
+    shared `dates` index (the union of every symbol's bar timestamps). valid[i, t]
+    is True where symbol i actually has a bar at dates[t]; everything else is NaN.
+    """
+    FIELDS = BAR_FIELDS
+    
+    def __init__(self, symbols, dates, values, valid):
+        self.symbols = list(symbols)
+        self.dates = pd.DatetimeIndex(dates)
+        self.values = values
+        self.valid = valid
+        self._pos = {s: i for i, s in enumerate(self.symbols)}
+    
+    def __len__(self):
+        return len(self.symbols)
+    
+    def __contains__(self, symbol):
+        return symbol in self._pos
+    
+    def __repr__(self):
+        return f"MarketPanel({len(self.symbols)} symbols × {len(self.dates)} bars)"
+    
+    @classmethod
+    def from_frames(cls, frames):
+        """Build a panel from {symbol: OHLCV DataFrame}; empty or missing frames are skipped."""
+        frames = {s: df for s, df in frames.items() if df is not None and not df.empty}
+        if not frames:
+            return None
+        dates = frames[next(iter(frames))].index
+        for df in list(frames.values())[1:]:
+            dates = dates.union(df.index)
+        dates = pd.DatetimeIndex(dates).sort_values()
+        
+        symbols = list(frames.keys())
+        values = np.full((len(symbols), len(dates), len(cls.FIELDS)), np.nan)
+        valid = np.zeros((len(symbols), len(dates)), dtype=bool)
+        for i, s in enumerate(symbols):
+            df = frames[s]
+            df = df[~df.index.duplicated(keep="last")]
+            pos = dates.get_indexer(df.index)
+            values[i, pos, :] = df[cls.FIELDS].to_numpy(dtype=float)
+            valid[i, pos] = True
+        return cls(symbols, dates, values, valid)
+    
+    @classmethod
+    def load(cls, symbols, interval="1d", start_date=None, end_date=None, source="fetch",
+             workers=None, progress=None):
+        """
+        Load a panel for `symbols`.
+        source="fetch" goes through fetch_stock_data on the scan thread pool;
+        source="store" reads the local bar store only (no network).
+        """
+        if start_date is None:
+            start_date = (datetime.now() - timedelta(days=TIMEFRAMES[interval]["days"])).strftime("%Y-%m-%d")
+        if end_date is None:
+            end_date = datetime.now().strftime("%Y-%m-%d")
+        symbols = list(symbols)
+        
+        if source == "store":
+            frames = {s: load_stored_frame(s, interval, start_date, end_date) for s in symbols}
+        else:
+            dfs = run_symbol_pool(
+                symbols, lambda s: fetch_stock_data(s, start_date=start_date, end_date=end_date, interval=interval),
+                workers=workers, progress=progress
             )
-            sentiment_counts[sentiment_text].append(s)
+            frames = dict(zip(symbols, dfs))
+        return cls.from_frames(frames)
+    
+    def field(self, name):
+        """(symbols × time) array for one OHLCV field."""
+        return self.values[:, :, self.FIELDS.index(name)]
+    
+    @property
+    def open(self):
+        return self.field("Open")
+    
+    @property
+    def high(self):
+        return self.field("High")
+    
+    @property
+    def low(self):
+        return self.field("Low")
+    
+    @property
+    def close(self):
+        return self.field("Close")
+    
+    @property
+    def volume(self):
+        return self.field("Volume")
+    
+    def last_valid_index(self):
+        """Per-symbol position of the latest bar (-1 for symbols without bars)."""
+        n = self.valid.shape[1]
+        last = n - 1 - np.argmax(self.valid[:, ::-1], axis=1)
+        return np.where(self.valid.any(axis=1), last, -1)
+    
+    def last_bar_times(self):
+        """{symbol: timestamp of its latest bar} for the symbols that have bars."""
+        return {s: self.dates[p] for s, p in zip(self.symbols, self.last_valid_index()) if p >= 0}
+    
+    def latest(self, array, offset=0):
+        """Value of a (symbols × time) array at each symbol's latest bar (offset=1 → previous bar)."""
+        if offset == 0:
+            pos = self.last_valid_index()
+        else:
+            # Position of the bar whose running count is `offset` short of the symbol's total
+            want = self.valid.sum(axis=1) - offset
+            hit = self.valid & (np.cumsum(self.valid, axis=1) == want[:, None])
+            pos = np.where(want > 0, np.argmax(hit, axis=1), -1)
+        out = np.full(len(self.symbols), np.nan)
+        has = pos >= 0
+        out[has] = array[np.flatnonzero(has), pos[has]]
+        return out
+    
+    def select(self, symbols):
+        """Sub-panel with the given symbols (unknown symbols are ignored)."""
+        idx = [self._pos[s] for s in symbols if s in self._pos]
+        return MarketPanel([self.symbols[i] for i in idx], self.dates, self.values[idx], self.valid[idx])
+    
+    def since(self, start):
+        """Sub-panel restricted to dates >= start."""
+        start = pd.Timestamp(start)
+        if self.dates.tz is not None and start.tz is None:
+            start = start.tz_localize(self.dates.tz)
+        keep = self.dates >= start
+        return MarketPanel(self.symbols, self.dates[keep], self.values[:, keep], self.valid[:, keep])
+    
+    def symbol_frame(self, symbol):
+        """OHLCV DataFrame with only the bars `symbol` actually has (same shape as fetch_stock_data)."""
+        i = self._pos[symbol]
+        mask = self.valid[i]
+        df = pd.DataFrame(self.values[i, mask, :], index=self.dates[mask], columns=self.FIELDS)
+        df.index.name = "Date"
+        return df
+    
+    def to_frame(self, name="Close"):
+        """Wide DataFrame (dates × symbols) for one field."""
+        return pd.DataFrame(self.field(name).T, index=self.dates, columns=self.symbols)
+
+# =============================================================================
+# PANEL INDICATORS - calculate_all_indicators on a whole MarketPanel at once
+# =============================================================================
+
+# Windows used by calculate_all_indicators. Column names stay the same when these
+# are changed (EMA10 is "the fast EMA", SMA5/SMA22/SMA50 follow sma_windows order).
+DEFAULT_INDICATOR_PARAMS = {
+    "bb_window": 20, "bb_dev": 2,
+    "macd_fast": 12, "macd_slow": 26, "macd_sign": 9,
+    "vsma_window": 15, "rsi_window": 14,
+    "ao_short": 5, "ao_long": 34, "cci_window": 20,
+    "ema_fast": 10, "ema_slow": 30,
+    "stoch_window": 3, "stoch_smooth": 3,
+    "kama_window": 10, "kama_pow1": 2, "kama_pow2": 30,
+    "sma_windows": (5, 22, 50), "cmf_window": 20,
+}
+
+def _pack_right(valid):
+    """
+    Index arrays that move each symbol's bars to the right end of its row, so
+    ragged histories become "NaN prefix + contiguous bars" and every symbol's
+    latest bar sits in the last column. Returns (rows, src_cols, dst_cols).
+    """
+    n_steps = valid.shape[1]
+    rows, cols = np.nonzero(valid)
+    rank = np.cumsum(valid, axis=1) - 1
+    dst = (n_steps - valid.sum(axis=1))[rows] + rank[rows, cols]
+    return rows, cols, dst
+
+def _rolling_apply(x, window, reduce):
+    """reduce(window values) along the time axis; NaN for incomplete windows or windows holding NaN."""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        out[:, window - 1:] = reduce(np.lib.stride_tricks.sliding_window_view(x, window, axis=1))
+    return out
+
+def _ewm_rows(x, alpha, min_periods):
+    """
+    pandas ewm(alpha, adjust=False).mean() for every row of a 2D array. Each row
+    starts at its first non-NaN value; alpha and min_periods may be per-row arrays.
+    """
+    n_rows, n_steps = x.shape
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (n_rows,))
+    min_periods = np.broadcast_to(np.asarray(min_periods), (n_rows,))
+    out = np.full(x.shape, np.nan)
+    prev = np.full(n_rows, np.nan)
+    count = np.zeros(n_rows, dtype=int)
+    for t in range(n_steps):
+        xt = x[:, t]
+        ok = ~np.isnan(xt)
+        prev = np.where(ok, np.where(np.isnan(prev), xt, prev + alpha * (xt - prev)), prev)
+        count += ok
+        out[:, t] = np.where(count >= min_periods, prev, np.nan)
+    return out
+
+def _kama_rows(close, window, pow1, pow2):
+    """ta.momentum.kama for every row of a right-packed close array."""
+    prev_close = np.concatenate([np.full((close.shape[0], 1), np.nan), close[:, :-1]], axis=1)
+    vol = np.abs(close - prev_close)
+    # ta seeds the first bar's change with a wrap-around value; any finite number gives the same KAMA
+    vol[np.isnan(vol) & ~np.isnan(close)] = 0.0
+    er_den = _rolling_apply(vol, window, lambda w: w.sum(axis=-1))
+    er_num = np.full(close.shape, np.nan)
+    er_num[:, window:] = np.abs(close[:, window:] - close[:, :-window])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        er = np.where(er_den != 0, er_num / er_den, 0.0)
+    er[np.isnan(er) & ~np.isnan(er_den)] = 0.0  # first KAMA bar: value unused, KAMA starts at close
+    fast, slow = 2.0 / (pow1 + 1), 2.0 / (pow2 + 1.0)
+    sc = (er * (fast - slow) + slow) ** 2.0
+    
+    out = np.full(close.shape, np.nan)
+    prev = np.full(close.shape[0], np.nan)
+    for t in range(close.shape[1]):
+        ok = ~np.isnan(sc[:, t])
+        step = np.where(np.isnan(prev), close[:, t], prev + sc[:, t] * (close[:, t] - prev))
+        prev = np.where(ok, step, prev)
+        out[:, t] = np.where(ok, prev, np.nan)
+    return out
+
+def compute_panel_indicators(panel, params=None, cache=None):
+    """
+    calculate_all_indicators for every symbol of a MarketPanel in one vectorized pass.
+    
+    Each symbol's bars are packed right-aligned so indicators run over that symbol's
+    own history only (exactly what the per-symbol version sees), then scattered back
+    onto panel.dates. Returns {column: (symbols × time) float array} with the
+    INDICATOR_COLUMNS; cells where a symbol has no bar are NaN, flags are 0/1.
+    Matches the `ta`-based columns to floating-point tolerance — see
+    verify_panel_indicators.
+    
+    `cache` is an optional dict of per-parameter intermediates (EMAs, RSI, rolling
+    windows...) reused across calls with different params on the *same* panel.
+    """
+    p = {**DEFAULT_INDICATOR_PARAMS, **(params or {})}
+    memo = {} if cache is None else cache
+    
+    def cached(key, fn):
+        if key not in memo:
+            memo[key] = fn()
+        return memo[key]
+    rows, src, dst = _pack_right(panel.valid)
+    n_rows, n_steps = panel.valid.shape
+    
+    def pack(a):
+        out = np.full((n_rows, n_steps), np.nan)
+        out[rows, dst] = a[rows, src]
+        return out
+    
+    def inputs():
+        has_bar = np.zeros((n_rows, n_steps), dtype=bool)
+        has_bar[rows, dst] = True
+        has_prev = np.zeros_like(has_bar)
+        has_prev[:, 1:] = has_bar[:, :-1]
+        return (has_bar, has_prev) + tuple(pack(panel.field(f)) for f in ("High", "Low", "Close", "Volume"))
+    has_bar, has_prev, high, low, close, volume = cached("inputs", inputs)
+    
+    def shift(a):
+        out = np.full(a.shape, np.nan)
+        out[:, 1:] = a[:, :-1]
+        return out
+    
+    def flag(cond):
+        return np.where(cond, 1.0, 0.0)
+    
+    def cross_up(f):
+        # pandas: f > f.shift(1), False on each symbol's first bar
+        return flag((f > shift(f)) & has_prev)
+    
+    mean = lambda w: w.mean(axis=-1)
+    ind = {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        prev_close, prev_volume = shift(close), shift(volume)
+        ind["Return"] = close - prev_close
+        ind["Return_pct"] = close / prev_close - 1
+        ind["Target_Cls"] = flag(ind["Return"] > 0)
+        ind["Vol_diff"] = volume - prev_volume
+        ind["Vol_change"] = volume / prev_volume - 1
+        
+        bbm = cached(("sma", p["bb_window"]), lambda: _rolling_apply(close, p["bb_window"], mean))
+        bb_std = cached(("std", p["bb_window"]), lambda: _rolling_apply(close, p["bb_window"], lambda w: w.std(axis=-1)))
+        ind["bb_bbm"] = bbm
+        ind["bb_bbh"] = bbm + p["bb_dev"] * bb_std
+        ind["bb_bbl"] = bbm - p["bb_dev"] * bb_std
+        
+        # All close-based EMAs share one pass: MACD fast/slow, EMA fast/slow
+        spans = [p["macd_fast"], p["macd_slow"], p["ema_fast"], p["ema_slow"]]
+        missing = [s for s in dict.fromkeys(spans) if ("ema", s) not in memo]
+        if missing:
+            emas = _ewm_rows(np.vstack([close] * len(missing)),
+                             alpha=np.repeat([2.0 / (s + 1) for s in missing], n_rows),
+                             min_periods=np.repeat(missing, n_rows))
+            for s, ema in zip(missing, np.split(emas, len(missing))):
+                memo[("ema", s)] = ema
+        ema_macd_fast, ema_macd_slow, ema_fast, ema_slow = (memo[("ema", s)] for s in spans)
+        
+        macd = ema_macd_fast - ema_macd_slow
+        macds = cached(("macds", p["macd_fast"], p["macd_slow"], p["macd_sign"]),
+                       lambda: _ewm_rows(macd, 2.0 / (p["macd_sign"] + 1), p["macd_sign"]))
+        ind["MACD"], ind["MACDS"] = macd, macds
+        ind["Diff"] = macd - macds
+        ind["Buy_MACD"] = flag(macd > macds)
+        ind["Buy_MACDS"] = cross_up(ind["Buy_MACD"])
+        ind["Buy_MACDS2"] = np.where((ind["Diff"] > 0) & (ind["Buy_MACDS"] == 1), 2.0, ind["Buy_MACDS"])
+        
+        ind["VSMA15"] = cached(("vsma", p["vsma_window"]), lambda: _rolling_apply(volume, p["vsma_window"], mean))
+        ind["OBV"] = np.nancumsum(np.where(close < prev_close, -volume, volume), axis=1)
+        
+        # Wilder RSI; ta counts each symbol's first bar (diff NaN) as a zero move
+        diff = ind["Return"]
+        up = np.where(has_bar, np.where(diff > 0, diff, 0.0), np.nan)
+        down = np.where(has_bar, np.where(diff < 0, -diff, 0.0), np.nan)
+        def rsi(w):
+            ema_up, ema_down = np.split(_ewm_rows(np.vstack([up, down]), 1.0 / w, w), 2)
+            return np.where(ema_down == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_down))
+        ind["RSI"] = cached(("rsi", p["rsi_window"]), lambda: rsi(p["rsi_window"]))
+        ind["Buy_RSI"] = flag(ind["RSI"] > 30)
+        ind["Buy_RSIS"] = cross_up(ind["Buy_RSI"])
+        
+        # ta's awesome_oscillator(fillna=True): partial windows from the first bar
+        median = 0.5 * (high + low)
+        ao = cached(("ao", p["ao_short"], p["ao_long"]),
+                    lambda: _rolling_mean(median, p["ao_short"], min_periods=1) - _rolling_mean(median, p["ao_long"], min_periods=1))
+        ind["AO"] = np.where(has_bar & np.isnan(ao), 0.0, ao)
+        ind["Buy_AO"] = flag(ind["AO"] > 0)
+        ind["Buy_AOS"] = cross_up(ind["Buy_AO"])
+        
+        typical = (high + low + close) / 3.0
+        def cci(w):
+            tp_mean = _rolling_apply(typical, w, mean)
+            tp_mad = _rolling_apply(typical, w, lambda v: np.abs(v - v.mean(axis=-1, keepdims=True)).mean(axis=-1))
+            return (typical - tp_mean) / (0.015 * tp_mad)
+        ind["CCI"] = cached(("cci", p["cci_window"]), lambda: cci(p["cci_window"]))
+        ind["Buy_CCI"] = flag(ind["CCI"] > 0)
+        ind["Buy_CCIS"] = cross_up(ind["Buy_CCI"])
+        
+        ind["EMA10"], ind["EMA30"] = ema_fast, ema_slow
+        ind["Buy_EMA10"] = flag(close > ema_fast)
+        ind["Buy_EMA10S"] = cross_up(ind["Buy_EMA10"])
+        ind["Buy_EMA10_EMA30"] = flag(ema_fast > ema_slow)
+        ind["Buy_EMA10_EMA30S"] = cross_up(ind["Buy_EMA10_EMA30"])
+        
+        def stoch(w, smooth):
+            lowest = _rolling_apply(low, w, lambda v: v.min(axis=-1))
+            highest = _rolling_apply(high, w, lambda v: v.max(axis=-1))
+            stoch_k = 100 * (close - lowest) / (highest - lowest)
+            return _rolling_apply(stoch_k, smooth, mean)
+        ind["Stochastic"] = cached(("stoch", p["stoch_window"], p["stoch_smooth"]),
+                                   lambda: stoch(p["stoch_window"], p["stoch_smooth"]))
+        ind["Stochastic_Buy"] = flag(ind["Stochastic"] > 20)
+        ind["Stochastic_BuyS"] = cross_up(ind["Stochastic_Buy"])
+        
+        kama = cached(("kama", p["kama_window"], p["kama_pow1"], p["kama_pow2"]),
+                      lambda: _kama_rows(close, p["kama_window"], p["kama_pow1"], p["kama_pow2"]))
+        ind["KAMA"] = kama
+        ind["Buy_KAMA"] = flag(close > kama)
+        ind["Buy_KAMAS"] = cross_up(ind["Buy_KAMA"])
+        
+        sma_names = ["SMA5", "SMA22", "SMA50"]
+        for name, window in zip(sma_names, p["sma_windows"]):
+            ind[name] = cached(("sma", window), lambda: _rolling_apply(close, window, mean))
+        for name in sma_names:
+            ind[f"Buy_{name}"] = flag(close > ind[name])
+        for name in sma_names:
+            ind[f"Buy_{name}S"] = cross_up(ind[f"Buy_{name}"])
+        
+        def cmf(w):
+            mfv = ((close - low) - (high - close)) / (high - low)
+            mfv = np.where(has_bar & np.isnan(mfv), 0.0, mfv) * volume
+            return _rolling_apply(mfv, w, lambda v: v.sum(axis=-1)) / _rolling_apply(volume, w, lambda v: v.sum(axis=-1))
+        ind["CMF"] = cached(("cmf", p["cmf_window"]), lambda: cmf(p["cmf_window"]))
+        ind["Buy_CMF"] = flag(ind["CMF"] > 0)
+        ind["Buy_CMFS"] = cross_up(ind["Buy_CMF"])
+    
+    # Back from right-packed rows onto panel.dates
+    out = {}
+    for name in INDICATOR_COLUMNS:
+        a = np.full((n_rows, n_steps), np.nan)
+        a[rows, src] = ind[name][rows, dst]
+        out[name] = a
+    return out
+
+def _indicator_chunk(in_specs, out_spec, lo, hi, dates, params):
+    """Process-pool task: compute_panel_indicators for panel rows lo:hi, read from and written to shared memory."""
+    from multiprocessing import shared_memory
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in in_specs + [out_spec]]
+    try:
+        values, valid, out = (np.ndarray(shape, dtype=dtype, buffer=b.buf)
+                              for b, (_, shape, dtype) in zip(blocks, in_specs + [out_spec]))
+        panel = MarketPanel(range(lo, hi), dates, values[lo:hi], valid[lo:hi])
+        for k, a in enumerate(compute_panel_indicators(panel, params).values()):
+            out[k, lo:hi] = a
+        del values, valid, out, panel
+    finally:
+        for b in blocks:
+            b.close()
+
+_CPU_POOL = None  # long-lived indicator process pool, see start_cpu_pool
+
+def start_cpu_pool(workers=None):
+    """
+    Fork the indicator process pool used by parallel_panel_indicators. Call it once,
+    before the process starts any threads (the batch CLI does); the workers are
+    forked right away so none is forked later from a threaded process. Workers are
+    capped at the CPU count, and without fork or with a single worker no pool is
+    started — chunking through processes only pays off on several cores.
+    """
+    global _CPU_POOL
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    workers = max(1, min(int(workers or CPU_WORKERS), os.cpu_count() or 1))
+    if _CPU_POOL is None and workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()  # workers share it for the scans' shared memory blocks
+        _CPU_POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        list(_CPU_POOL.map(abs, range(workers)))  # spawns every worker now
+        import atexit
+        atexit.register(_CPU_POOL.shutdown)
+    return _CPU_POOL
+
+def parallel_panel_indicators(panel, params=None, workers=None):
+    """
+    compute_panel_indicators split into symbol chunks on the process pool of
+    start_cpu_pool, i.e. in the batch CLI only.
+    
+    The panel's bar arrays and the (column × symbol × time) result live in
+    shared memory, so workers neither unpickle DataFrames nor pickle results
+    back. Rows are independent, so the result equals the in-process one. Small
+    panels, and processes without a started pool (the Streamlit server), run
+    in-process.
+    """
+    workers = max(1, int(workers or CPU_WORKERS))
+    n_rows, n_steps = panel.valid.shape
+    pool = _CPU_POOL
+    if pool is None or workers == 1 or n_rows < CPU_MIN_SYMBOLS:
+        return compute_panel_indicators(panel, params)
+    
+    from multiprocessing import shared_memory
+    arrays = [np.ascontiguousarray(panel.values, dtype=np.float64), np.ascontiguousarray(panel.valid)]
+    out_shape = (len(INDICATOR_COLUMNS), n_rows, n_steps)
+    blocks, specs = [], []
+    try:
+        for a in arrays:
+            b = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            blocks.append(b)
+            np.ndarray(a.shape, dtype=a.dtype, buffer=b.buf)[...] = a
+            specs.append((b.name, a.shape, a.dtype.str))
+        out_block = shared_memory.SharedMemory(create=True, size=int(np.prod(out_shape)) * 8)
+        blocks.append(out_block)
+        out_spec = (out_block.name, out_shape, "<f8")
+        
+        # A few chunks per worker keeps them busy when symbols' histories differ in length
+        bounds = np.linspace(0, n_rows, min(n_rows, workers * 4) + 1).astype(int)
+        futures = [pool.submit(_indicator_chunk, specs, out_spec, lo, hi, panel.dates, params)
+                   for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+        for fut in futures:
+            fut.result()
+        out = np.ndarray(out_shape, dtype=np.float64, buffer=out_block.buf)
+        result = {name: out[k].copy() for k, name in enumerate(INDICATOR_COLUMNS)}
+        del out
+        return result
+    finally:
+        for b in blocks:
+            b.close()
+            b.unlink()
+
+def summarize_panel(panel, indicators=None):
+    """
+    Market-summary classification of every panel symbol at its latest bar:
+    {symbol: (sentiment_text, above_sma50)} with above_sma50 None when SMA50 has
+    no value yet. Same result as calculate_original_scores + calculate_sentiment per symbol.
+    """
+    if indicators is None:
+        indicators = compute_panel_indicators(panel)
+    ind2 = sum(panel.latest(indicators[c]) for c in SCORE_FLAG_COLUMNS)
+    close = panel.latest(panel.close)
+    prev_close = panel.latest(panel.close, offset=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vol2 = panel.latest(panel.volume) / panel.latest(indicators["VSMA15"])
+    rsi = panel.latest(indicators["RSI"])
+    diff = panel.latest(indicators["Diff"])
+    sma50 = panel.latest(indicators["SMA50"])
+    n_bars = panel.valid.sum(axis=1)
+    
+    out = {}
+    for i, s in enumerate(panel.symbols):
+        if n_bars[i] == 0:
+            continue
+        price_change_pct = ((close[i] - prev_close[i]) / prev_close[i]) * 100 if n_bars[i] > 1 else 0
+        sentiment_text, _, _, _ = calculate_sentiment(float(ind2[i]), float(vol2[i]), rsi[i], diff[i], price_change_pct)
+        above = None if np.isnan(sma50[i]) else bool(close[i] > sma50[i])
+        out[s] = (sentiment_text, above)
+    return out
+
+def panel_indicator_frame(panel, indicators, symbol):
+    """One symbol's OHLCV + indicator DataFrame, shaped like calculate_all_indicators output."""
+    i = panel.symbols.index(symbol)
+    mask = panel.valid[i]
+    df = panel.symbol_frame(symbol)
+    for name in INDICATOR_COLUMNS:
+        df[name] = indicators[name][i, mask]
+    return df
+
+def verify_panel_indicators(panel, indicators=None, symbols=None, rtol=1e-6, atol=1e-8):
+    """
+    Compare compute_panel_indicators with calculate_all_indicators symbol by symbol.
+    Returns a DataFrame per column: max absolute error, number of cells outside
+    rtol/atol (NaN placement must match) and an ok flag.
+    """
+    if indicators is None:
+        indicators = compute_panel_indicators(panel)
+    stats = {name: [0.0, 0] for name in INDICATOR_COLUMNS}
+    for s in symbols or panel.symbols:
+        expected = calculate_all_indicators(panel.symbol_frame(s))
+        got = panel_indicator_frame(panel, indicators, s)
+        for name in INDICATOR_COLUMNS:
+            a = pd.to_numeric(expected[name], errors="coerce").to_numpy(dtype=float)
+            b = got[name].to_numpy(dtype=float)
+            close = np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+            both = np.isfinite(a) & np.isfinite(b)
+            if both.any():
+                stats[name][0] = max(stats[name][0], float(np.max(np.abs(a[both] - b[both]))))
+            stats[name][1] += int((~close).sum())
+    report = pd.DataFrame([(name, err, bad, bad == 0) for name, (err, bad) in stats.items()],
+                          columns=["column", "max_abs_err", "mismatches", "ok"])
+    return report
+
+# =============================================================================
+# INDICATOR KERNELS - pluggable NumPy indicators for single frames and whole panels
+# =============================================================================
+
+# name -> {"fn", "inputs", "outputs": {column: dtype}, "warmup": fn(params) -> bars, "params"}
+INDICATOR_KERNELS = {}
+
+def register_kernel(name, inputs, outputs, warmup, **params):
+    """
+    Register fn(*input_arrays, **params) -> {column: array} as indicator kernel `name`.
+    
+    Kernels take right-packed (rows × time) float arrays of the `inputs` OHLCV
+    fields — each row is one symbol's own bars, NaN-padded on the left — and
+    return arrays of the same shape. `outputs` maps each column to its dtype
+    (integer columns use 0 where there is no value), `warmup(params)` is the
+    number of leading bars without a value and `params` are the defaults.
+    Every output also becomes a compute_indicators / cached_indicators column.
+    """
+    def deco(fn):
+        INDICATOR_KERNELS[name] = {"fn": fn, "inputs": tuple(inputs), "outputs": dict(outputs),
+                                   "warmup": warmup, "params": params}
+        register_indicator(list(outputs), inputs)(
+            lambda c: {col: a[0] for col, a in _run_kernel(name, [np.asarray(c[f], dtype=float)[None, :] for f in inputs]).items()})
+        return fn
+    return deco
+
+def kernel_warmup(name, params=None):
+    """Leading bars without a value for a kernel with the given params."""
+    k = INDICATOR_KERNELS[name]
+    return int(k["warmup"]({**k["params"], **(params or {})}))
+
+def _run_kernel(name, arrays, params=None):
+    """Run one kernel on packed input arrays; outputs cast to their declared dtypes."""
+    k = INDICATOR_KERNELS[name]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = k["fn"](*arrays, **{**k["params"], **(params or {})})
+    out = {}
+    for col, dtype in k["outputs"].items():
+        a = result[col]
+        out[col] = np.nan_to_num(a, nan=0).astype(dtype) if np.issubdtype(dtype, np.integer) else a.astype(dtype)
+    return out
+
+def compute_kernels(df, names=None, params=None):
+    """
+    Add the outputs of the named kernels (default: all) to an OHLCV DataFrame.
+    `params` maps kernel name -> parameter overrides. Returns df.
+    """
+    if df is None or df.empty:
+        return df
+    for name in names or INDICATOR_KERNELS:
+        inputs = [df[f].to_numpy(dtype=float)[None, :] for f in INDICATOR_KERNELS[name]["inputs"]]
+        for col, a in _run_kernel(name, inputs, (params or {}).get(name)).items():
+            df[col] = a[0]
+    return df
+
+def compute_panel_kernels(panel, names=None, params=None):
+    """
+    The named kernels (default: all) for every symbol of a MarketPanel in one pass.
+    Returns {column: (symbols × time) array} on panel.dates, like
+    compute_panel_indicators; cells without a bar are NaN (0 for integer columns).
+    """
+    rows, src, dst = _pack_right(panel.valid)
+    n_rows, n_steps = panel.valid.shape
+    packed = {}
+    def field(f):
+        if f not in packed:
+            a = np.full((n_rows, n_steps), np.nan)
+            a[rows, dst] = panel.field(f)[rows, src]
+            packed[f] = a
+        return packed[f]
+    
+    out = {}
+    for name in names or INDICATOR_KERNELS:
+        k = INDICATOR_KERNELS[name]
+        result = _run_kernel(name, [field(f) for f in k["inputs"]], (params or {}).get(name))
+        for col, a in result.items():
+            full = np.zeros((n_rows, n_steps), dtype=a.dtype) if np.issubdtype(a.dtype, np.integer) \
+                else np.full((n_rows, n_steps), np.nan, dtype=a.dtype)
+            full[rows, src] = a[rows, dst]
+            out[col] = full
+    return out
+
+def kernel_snapshot(panel, names=None, params=None):
+    """Latest value of every kernel output per symbol, as a DataFrame indexed by symbol (for scans)."""
+    values = compute_panel_kernels(panel, names, params)
+    return pd.DataFrame({col: panel.latest(a) for col, a in values.items()}, index=pd.Index(panel.symbols, name="symbol"))
+
+def _shift_rows(a):
+    out = np.full(a.shape, np.nan)
+    out[:, 1:] = a[:, :-1]
+    return out
+
+def _wilder_rows(x, window):
+    """
+    Wilder smoothing per row: the mean of the first `window` values, then
+    prev + (x - prev) / window. Each row starts at its first non-NaN value.
+    """
+    n_rows, n_steps = x.shape
+    out = np.full(x.shape, np.nan)
+    prev = np.full(n_rows, np.nan)
+    total = np.zeros(n_rows)
+    count = np.zeros(n_rows, dtype=int)
+    for t in range(n_steps):
+        xt = x[:, t]
+        ok = ~np.isnan(xt)
+        count += ok
+        total = np.where(ok & (count <= window), total + np.nan_to_num(xt), total)
+        prev = np.where(ok & (count == window), total / window,
+                        np.where(ok & (count > window), prev + (xt - prev) / window, prev))
+        out[:, t] = np.where(count >= window, prev, np.nan)
+    return out
+
+def _true_range(high, low, close):
+    """max(high - low, |high - prev close|, |low - prev close|); high - low on a symbol's first bar."""
+    prev_close = _shift_rows(close)
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+@register_kernel("ATR", ["High", "Low", "Close"], {"ATR": np.float64}, warmup=lambda p: p["window"] - 1, window=14)
+def _atr_kernel(high, low, close, window):
+    """Average true range, as ta.volatility.average_true_range (NaN instead of 0 during warm-up)."""
+    return {"ATR": _wilder_rows(_true_range(high, low, close), window)}
+
+@register_kernel("ADX", ["High", "Low", "Close"], {"ADX": np.float64, "ADX_POS": np.float64, "ADX_NEG": np.float64},
+                 warmup=lambda p: 2 * p["window"] - 1, window=14)
+def _adx_kernel(high, low, close, window):
+    """Wilder's ADX with +DI / -DI; directional movement starts on each symbol's second bar."""
+    up = high - _shift_rows(high)
+    down = _shift_rows(low) - low
+    pos_dm = np.where(np.isnan(up), np.nan, np.where((up > down) & (up > 0), up, 0.0))
+    neg_dm = np.where(np.isnan(down), np.nan, np.where((down > up) & (down > 0), down, 0.0))
+    tr = np.where(np.isnan(up), np.nan, _true_range(high, low, close))
+    tr_s = _wilder_rows(tr, window)
+    di_pos = np.where(tr_s > 0, 100 * _wilder_rows(pos_dm, window) / tr_s, np.where(np.isnan(tr_s), np.nan, 0.0))
+    di_neg = np.where(tr_s > 0, 100 * _wilder_rows(neg_dm, window) / tr_s, np.where(np.isnan(tr_s), np.nan, 0.0))
+    di_sum = di_pos + di_neg
+    dx = np.where(di_sum > 0, 100 * np.abs(di_pos - di_neg) / di_sum, np.where(np.isnan(di_sum), np.nan, 0.0))
+    return {"ADX": _wilder_rows(dx, window), "ADX_POS": di_pos, "ADX_NEG": di_neg}
+
+@register_kernel("Ichimoku", ["High", "Low"],
+                 {"ICHI_CONV": np.float64, "ICHI_BASE": np.float64, "ICHI_A": np.float64, "ICHI_B": np.float64},
+                 warmup=lambda p: max(p["window1"], p["window2"], p["window3"]) - 1, window1=9, window2=26, window3=52)
+def _ichimoku_kernel(high, low, window1, window2, window3):
+    """
+    Ichimoku lines as ta.trend.IchimokuIndicator(visual=False): spans are not shifted
+    forward. Span B waits for a full window3 (ta averages partial windows).
+    """
+    def midpoint(w):
+        return 0.5 * (_rolling_apply(high, w, lambda v: v.max(axis=-1)) + _rolling_apply(low, w, lambda v: v.min(axis=-1)))
+    conv, base = midpoint(window1), midpoint(window2)
+    return {"ICHI_CONV": conv, "ICHI_BASE": base, "ICHI_A": 0.5 * (conv + base), "ICHI_B": midpoint(window3)}
+
+@register_kernel("SuperTrend", ["High", "Low", "Close"], {"SuperTrend": np.float64, "SuperTrend_Dir": np.int8},
+                 warmup=lambda p: p["window"] - 1, window=10, multiplier=3.0)
+def _supertrend_kernel(high, low, close, window, multiplier):
+    """
+    SuperTrend on ATR bands around the bar midpoint. The lower band only rises and the
+    upper band only falls while the previous close stays on their side; the trend
+    (+1 / -1, starting up) flips when the close crosses the opposite band.
+    """
+    atr = _atr_kernel(high, low, close, window)["ATR"]
+    mid = 0.5 * (high + low)
+    basic_up, basic_dn = mid - multiplier * atr, mid + multiplier * atr
+    n_rows, n_steps = close.shape
+    line = np.full(close.shape, np.nan)
+    trend = np.zeros(close.shape)
+    up = np.full(n_rows, np.nan)
+    dn = np.full(n_rows, np.nan)
+    prev_close = np.full(n_rows, np.nan)
+    prev_trend = np.zeros(n_rows)
+    for t in range(n_steps):
+        ok = ~np.isnan(basic_up[:, t])
+        new_up = np.where(prev_close > up, np.fmax(basic_up[:, t], up), basic_up[:, t])
+        new_dn = np.where(prev_close < dn, np.fmin(basic_dn[:, t], dn), basic_dn[:, t])
+        c = close[:, t]
+        tr = np.where(prev_trend == 0, 1.0,
+                      np.where((prev_trend < 0) & (c > dn), 1.0,
+                               np.where((prev_trend > 0) & (c < up), -1.0, prev_trend)))
+        up = np.where(ok, new_up, up)
+        dn = np.where(ok, new_dn, dn)
+        prev_trend = np.where(ok, tr, prev_trend)
+        prev_close = np.where(ok, c, prev_close)
+        trend[:, t] = np.where(ok, prev_trend, 0.0)
+        line[:, t] = np.where(ok, np.where(prev_trend > 0, up, dn), np.nan)
+    return {"SuperTrend": line, "SuperTrend_Dir": trend}
+
+@register_kernel("VWAP", ["High", "Low", "Close", "Volume"], {"VWAP": np.float64}, warmup=lambda p: p["window"] - 1, window=14)
+def _vwap_kernel(high, low, close, volume, window):
+    """Rolling volume-weighted typical price, as ta.volume.volume_weighted_average_price."""
+    typical = (high + low + close) / 3.0
+    total = lambda v: v.sum(axis=-1)
+    return {"VWAP": _rolling_apply(typical * volume, window, total) / _rolling_apply(volume, window, total)}
+
+# =============================================================================
+# STREAMING INDICATORS - resumable per-symbol state, advanced one closed bar at a time
+# =============================================================================
+
+# Timeframes whose screener runs use persisted incremental indicator state
+STREAMING_INTERVALS = ("1m", "5m", "15m", "30m", "1h", "4h")
+BAR_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600,
+               "4h": 14400, "1d": 86400, "1wk": 604800}
+
+class IndicatorState:
+    """
+    Running state for every calculate_all_indicators column: EMA accumulators,
+    Wilder RSI averages, OBV, KAMA and small ring buffers for the windowed
+    indicators. update() consumes one bar and returns that bar's indicator row,
+    identical to the last row calculate_all_indicators would produce for the same
+    history. State survives restarts via to_dict()/from_dict().
+    """
+    EMAS = ("macd_fast", "macd_slow", "ema_fast", "ema_slow")
+    CROSS_FLAGS = ("Buy_MACD", "Buy_RSI", "Buy_AO", "Buy_CCI", "Buy_EMA10", "Buy_EMA10_EMA30",
+                   "Stochastic_Buy", "Buy_KAMA", "Buy_SMA5", "Buy_SMA22", "Buy_SMA50", "Buy_CMF")
+    
+    def __init__(self, params=None):
+        from collections import deque
+        self.params = {**DEFAULT_INDICATOR_PARAMS, **(params or {})}
+        p = self.params
+        self.n = 0
+        self.last_ts = None
+        self.prev_close = np.nan
+        self.prev_volume = np.nan
+        self.ema = {name: [np.nan, 0] for name in self.EMAS + ("macd_sign", "rsi_up", "rsi_down")}
+        self.obv = 0.0
+        self.kama = np.nan
+        self.flags = {}
+        self.last_row = None
+        close_len = max(p["bb_window"], max(p["sma_windows"]), p["kama_window"] + 1)
+        self.buf = {
+            "close": deque(maxlen=close_len),
+            "move": deque(maxlen=p["kama_window"]),
+            "median": deque(maxlen=max(p["ao_short"], p["ao_long"])),
+            "high": deque(maxlen=p["stoch_window"]),
+            "low": deque(maxlen=p["stoch_window"]),
+            "stoch_k": deque(maxlen=p["stoch_smooth"]),
+            "typical": deque(maxlen=p["cci_window"]),
+            "volume": deque(maxlen=max(p["vsma_window"], p["cmf_window"])),
+            "mfv": deque(maxlen=p["cmf_window"]),
+        }
+    
+    def _ewm(self, name, x, alpha, min_periods):
+        acc = self.ema[name]
+        if not np.isnan(x):
+            acc[0] = x if np.isnan(acc[0]) else acc[0] + alpha * (x - acc[0])
+            acc[1] += 1
+        return acc[0] if acc[1] >= min_periods else np.nan
+    
+    @staticmethod
+    def _tail(buf, window):
+        """Last `window` values as an array, or None if fewer are buffered."""
+        return np.array(buf)[-window:] if len(buf) >= window else None
+    
+    def update(self, ts, high, low, close, volume):
+        """Advance by one bar and return its row {column: value} (plus Close and Volume)."""
+        p = self.params
+        high, low, close, volume = (np.float64(x) for x in (high, low, close, volume))
+        row = {"Close": close, "Volume": volume}
+        first = self.n == 0
+        prev_close = self.prev_close
+        
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ret = close - prev_close
+            row["Return"] = ret
+            row["Return_pct"] = close / prev_close - 1
+            row["Target_Cls"] = 1.0 if ret > 0 else 0.0
+            row["Vol_diff"] = volume - self.prev_volume
+            row["Vol_change"] = volume / self.prev_volume - 1
             
-            # SMA50 check
-            if pd.notna(latest.get('SMA50', np.nan)):
-                if latest['Close'] > latest['SMA50']:
-                    above_sma50.append(s)
-                else:
-                    below_sma50.append(s)
+            b = self.buf
+            b["close"].append(close)
+            b["volume"].append(volume)
+            b["move"].append(0.0 if first else abs(close - prev_close))
+            b["median"].append(0.5 * (high + low))
+            b["high"].append(high)
+            b["low"].append(low)
+            typical = (high + low + close) / 3.0
+            b["typical"].append(typical)
+            
+            w = self._tail(b["close"], p["bb_window"])
+            bbm = w.mean() if w is not None else np.nan
+            bb_std = w.std() if w is not None else np.nan
+            row["bb_bbm"] = bbm
+            row["bb_bbh"] = bbm + p["bb_dev"] * bb_std
+            row["bb_bbl"] = bbm - p["bb_dev"] * bb_std
+            
+            emas = {name: self._ewm(name, close, 2.0 / (p[name] + 1), p[name]) for name in self.EMAS}
+            macd = emas["macd_fast"] - emas["macd_slow"]
+            macds = self._ewm("macd_sign", macd, 2.0 / (p["macd_sign"] + 1), p["macd_sign"])
+            row["MACD"], row["MACDS"] = macd, macds
+            row["Diff"] = macd - macds
+            row["Buy_MACD"] = 1.0 if macd > macds else 0.0
+            
+            w = self._tail(b["volume"], p["vsma_window"])
+            row["VSMA15"] = w.mean() if w is not None else np.nan
+            self.obv += -volume if close < prev_close else volume
+            row["OBV"] = self.obv
+            
+            diff = 0.0 if first else ret
+            up = self._ewm("rsi_up", diff if diff > 0 else 0.0, 1.0 / p["rsi_window"], p["rsi_window"])
+            down = self._ewm("rsi_down", -diff if diff < 0 else 0.0, 1.0 / p["rsi_window"], p["rsi_window"])
+            row["RSI"] = 100.0 if down == 0 else 100.0 - 100.0 / (1.0 + up / down)
+            row["Buy_RSI"] = 1.0 if row["RSI"] > 30 else 0.0
+            
+            med = np.array(b["median"])
+            row["AO"] = med[-p["ao_short"]:].mean() - med[-p["ao_long"]:].mean()
+            if np.isnan(row["AO"]):
+                row["AO"] = 0.0
+            row["Buy_AO"] = 1.0 if row["AO"] > 0 else 0.0
+            
+            w = self._tail(b["typical"], p["cci_window"])
+            if w is not None:
+                row["CCI"] = (typical - w.mean()) / (0.015 * np.abs(w - w.mean()).mean())
             else:
-                sma50_na.append(s)
-        except:
-            sentiment_counts["ERROR"].append(s)
-            sma50_na.append(s)
-            continue
+                row["CCI"] = np.nan
+            row["Buy_CCI"] = 1.0 if row["CCI"] > 0 else 0.0
+            
+            row["EMA10"], row["EMA30"] = emas["ema_fast"], emas["ema_slow"]
+            row["Buy_EMA10"] = 1.0 if close > emas["ema_fast"] else 0.0
+            row["Buy_EMA10_EMA30"] = 1.0 if emas["ema_fast"] > emas["ema_slow"] else 0.0
+            
+            hi, lo = self._tail(b["high"], p["stoch_window"]), self._tail(b["low"], p["stoch_window"])
+            stoch_k = 100 * (close - lo.min()) / (hi.max() - lo.min()) if hi is not None else np.nan
+            b["stoch_k"].append(stoch_k)
+            w = self._tail(b["stoch_k"], p["stoch_smooth"])
+            row["Stochastic"] = w.mean() if w is not None else np.nan
+            row["Stochastic_Buy"] = 1.0 if row["Stochastic"] > 20 else 0.0
+            
+            # KAMA starts at the close of the window-th bar, then follows the smoothing constant
+            kw = p["kama_window"]
+            if self.n + 1 >= kw:
+                if np.isnan(self.kama):
+                    self.kama = close
+                else:
+                    er_den = sum(b["move"])
+                    er = abs(close - b["close"][-kw - 1]) / er_den if er_den != 0 else 0.0
+                    fast, slow = 2.0 / (p["kama_pow1"] + 1), 2.0 / (p["kama_pow2"] + 1.0)
+                    sc = (er * (fast - slow) + slow) ** 2.0
+                    self.kama = self.kama + sc * (close - self.kama)
+            row["KAMA"] = self.kama
+            row["Buy_KAMA"] = 1.0 if close > self.kama else 0.0
+            
+            for name, window in zip(("SMA5", "SMA22", "SMA50"), p["sma_windows"]):
+                w = self._tail(b["close"], window)
+                row[name] = w.mean() if w is not None else np.nan
+                row[f"Buy_{name}"] = 1.0 if close > row[name] else 0.0
+            
+            mfv = ((close - low) - (high - close)) / (high - low)
+            b["mfv"].append((0.0 if np.isnan(mfv) else mfv) * volume)
+            w_mfv, w_vol = self._tail(b["mfv"], p["cmf_window"]), self._tail(b["volume"], p["cmf_window"])
+            row["CMF"] = w_mfv.sum() / w_vol.sum() if w_mfv is not None else np.nan
+            row["Buy_CMF"] = 1.0 if row["CMF"] > 0 else 0.0
+        
+        # Crossovers: flag rose since the previous bar (never on the first bar)
+        for name in self.CROSS_FLAGS:
+            row[f"{name}S"] = 1.0 if (not first and row[name] > self.flags[name]) else 0.0
+            self.flags[name] = row[name]
+        row["Buy_MACDS2"] = 2.0 if (row["Diff"] > 0 and row["Buy_MACDS"] == 1) else row["Buy_MACDS"]
+        
+        self.n += 1
+        self.last_ts = int(ts)
+        self.prev_close = close
+        self.prev_volume = volume
+        self.last_row = row
+        return row
+    
+    def to_dict(self):
+        return {
+            "params": {k: list(v) if isinstance(v, tuple) else v for k, v in self.params.items()},
+            "n": self.n, "last_ts": self.last_ts,
+            "prev_close": float(self.prev_close), "prev_volume": float(self.prev_volume),
+            "ema": {k: [float(v), c] for k, (v, c) in self.ema.items()},
+            "obv": float(self.obv), "kama": float(self.kama),
+            "flags": {k: float(v) for k, v in self.flags.items()},
+            "buf": {k: [float(x) for x in v] for k, v in self.buf.items()},
+            "last_row": {k: float(v) for k, v in self.last_row.items()} if self.last_row else None,
+        }
     
-    prog.empty()
-    stat.empty()
-    return sentiment_counts, above_sma50, below_sma50, sma50_na
+    @classmethod
+    def from_dict(cls, data):
+        params = {k: tuple(v) if isinstance(v, list) else v for k, v in data["params"].items()}
+        state = cls(params)
+        state.n, state.last_ts = data["n"], data["last_ts"]
+        state.prev_close, state.prev_volume = data["prev_close"], data["prev_volume"]
+        state.ema = {k: [v, c] for k, (v, c) in data["ema"].items()}
+        state.obv, state.kama = data["obv"], data["kama"]
+        state.flags = dict(data["flags"])
+        state.last_row = data.get("last_row")
+        for k, values in data["buf"].items():
+            state.buf[k].extend(values)
+        return state
+
+def _indicator_state_path(symbol, interval):
+    return os.path.join(BAR_STORE_DIR, interval, f"{symbol}.state.json")
+
+def load_indicator_state(symbol, interval, params=None):
+    """Persisted IndicatorState for (symbol, interval), or None if missing or built with other params."""
+    import json
+    try:
+        with open(_indicator_state_path(symbol, interval), "r") as f:
+            state = IndicatorState.from_dict(json.load(f))
+    except Exception:
+        return None
+    return state if state.params == IndicatorState(params).params else None
+
+def save_indicator_state(symbol, interval, state):
+    import json, threading
+    path = _indicator_state_path(symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state.to_dict(), f)
+    os.replace(tmp, path)
+
+def streaming_indicator_row(symbol, interval, df, params=None):
+    """
+    Indicator row for the last bar of `df`, advancing the persisted state by the
+    bars that closed since the last call instead of recomputing the window. Only
+    closed bars are committed to the state; a still-forming last bar is evaluated
+    on a copy. The state is rebuilt from `df` when it is missing or no longer
+    overlaps the fetched bars. Long-memory columns (EMA, RSI, KAMA, OBV) therefore
+    continue from the first bar ever seen rather than restarting at the window start.
+    """
+    import copy
+    if df is None or df.empty:
+        return None
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(BAR_TZ)
+    ts = np.asarray((index - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(1, "ns"), dtype=np.int64)
+    bars = df[["High", "Low", "Close", "Volume"]].to_numpy(dtype=float)
+    
+    # A bar is closed once its whole interval has passed
+    now = pd.Timestamp.now(tz="UTC").value
+    n_closed = int(np.searchsorted(ts + BAR_SECONDS.get(interval, 86400) * 10**9, now, side="right"))
+    
+    state = load_indicator_state(symbol, interval, params)
+    if state is None or state.last_ts is None or state.last_ts not in set(ts.tolist()):
+        state, start = IndicatorState(params), 0
+    else:
+        start = int(np.searchsorted(ts, state.last_ts, side="right"))
+    
+    for i in range(start, n_closed):
+        state.update(ts[i], *bars[i])
+    if start < n_closed:
+        save_indicator_state(symbol, interval, state)
+    if n_closed < len(ts):
+        return copy.deepcopy(state).update(ts[-1], *bars[-1])
+    return state.last_row
 
 def create_gauge(v, t, m=5):
     fig = go.Figure(go.Indicator(
@@ -758,6 +3240,135 @@ def create_rsi_chart(df):
                       legend=dict(orientation="h", yanchor="top", y=-0.2, xanchor="center", x=0.5, font=dict(size=10)))
     return fig
 
+# =============================================================================
+# HTTP TRANSPORT - pooled keep-alive connections for all upstream APIs
+# =============================================================================
+
+HTTP_POOL_SIZE = int(os.getenv("BIST_HTTP_POOL_SIZE", "16"))  # connections kept alive per host
+HTTP_RETRIES = int(os.getenv("BIST_HTTP_RETRIES", "3"))       # extra attempts after the first
+HTTP_BACKOFF = 0.5                                             # seconds, doubled per attempt
+HTTP_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class HttpTransport:
+    """
+    Shared HTTP layer for İş Yatırım, Yahoo, OECD and CDS requests.
+    
+    One HTTPAdapter (urllib3 pool manager, keep-alive pool per host) is mounted on
+    a requests.Session per thread, so connections are reused across threads and
+    sessions without sharing cookie jars. Responses are negotiated with gzip, and
+    every call follows the same retry/backoff policy and records per-host latency.
+    """
+    
+    def __init__(self, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF):
+        import threading
+        from requests.adapters import HTTPAdapter
+        self.retries = retries
+        self.backoff = backoff
+        self._adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=0)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {}  # host -> counters
+    
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+            self._local.session = session
+        return session
+    
+    def _record(self, host, elapsed_ms=None, status=None, error=False, retry=False):
+        with self._lock:
+            s = self._stats.setdefault(host, {"requests": 0, "errors": 0, "retries": 0,
+                                              "total_ms": 0.0, "max_ms": 0.0, "last_status": None})
+            if elapsed_ms is not None:
+                s["requests"] += 1
+                s["total_ms"] += elapsed_ms
+                s["max_ms"] = max(s["max_ms"], elapsed_ms)
+            if status is not None:
+                s["last_status"] = status
+            if error:
+                s["errors"] += 1
+            if retry:
+                s["retries"] += 1
+    
+    def get(self, url, params=None, headers=None, timeout=20, verify=True, limiter=None, retries=None):
+        """
+        GET with the shared retry policy: connection errors, timeouts and
+        HTTP_RETRY_STATUS responses are retried with exponential backoff.
+        If a rate limiter is given, each attempt takes a token and 429/503
+        responses throttle it instead of sleeping here.
+        Returns the last response, or re-raises the last network exception.
+        """
+        import time
+        from urllib.parse import urlsplit
+        host = urlsplit(url).netloc
+        retries = self.retries if retries is None else retries
+        
+        for attempt in range(retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                resp = self._session().get(url, params=params, headers=headers, timeout=timeout, verify=verify)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                self._record(host, (time.monotonic() - t0) * 1000, error=True)
+                if attempt < retries:
+                    self._record(host, retry=True)
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+                raise
+            self._record(host, (time.monotonic() - t0) * 1000, status=resp.status_code,
+                         error=resp.status_code >= 400)
+            
+            if resp.status_code in HTTP_RETRY_STATUS and attempt < retries:
+                self._record(host, retry=True)
+                retry_after = _retry_after_seconds(resp)
+                if limiter is not None and resp.status_code in (429, 503):
+                    limiter.on_throttle(retry_after)
+                else:
+                    time.sleep(retry_after or self.backoff * 2 ** attempt)
+                continue
+            if limiter is not None and resp.status_code == 200:
+                limiter.on_success()
+            return resp
+        return resp
+    
+    def host_stats(self):
+        """Per-host request counts and latency as a DataFrame (one row per host)."""
+        with self._lock:
+            rows = [
+                {"host": host, "requests": s["requests"], "errors": s["errors"], "retries": s["retries"],
+                 "avg ms": round(s["total_ms"] / s["requests"], 1) if s["requests"] else None,
+                 "max ms": round(s["max_ms"], 1), "last status": s["last_status"]}
+                for host, s in self._stats.items()
+            ]
+        return pd.DataFrame(rows)
+
+
+def _retry_after_seconds(resp):
+    """Parse a numeric Retry-After header (seconds); None if absent or not numeric."""
+    try:
+        value = float(resp.headers.get("Retry-After", ""))
+        return min(max(value, 0.0), 60.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@st.cache_resource
+def get_http_transport():
+    """Process-wide HTTP transport shared by every session."""
+    return HttpTransport()
+
+
+def http_get(url, **kwargs):
+    """requests.get replacement routed through the shared pooled transport."""
+    return get_http_transport().get(url, **kwargs)
+
+
 # =============================================================================
 # FUNDAMENTAL DATA - İş Yatırım Balance Sheet API
 # =============================================================================
@@ -797,167 +3408,248 @@ KEY_INCOME_BY_DESC = {
     "net_profit_parent":   ("Net Profit (Parent)",       ["ana ortaklık payları", "ana ortaklık net"]),
 }
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_balance_sheet(symbol, years=None):
+# İş Yatırım request budget. The limiter starts at ISYATIRIM_RATE requests/second,
+# creeps up while the API answers normally and backs off hard on 429/503.
+ISYATIRIM_RATE = float(os.getenv("BIST_ISYATIRIM_RATE", "4"))
+ISYATIRIM_MAX_RATE = float(os.getenv("BIST_ISYATIRIM_MAX_RATE", "20"))
+IMPORT_WORKERS = int(os.getenv("BIST_IMPORT_WORKERS", "6"))
+
+
+class AdaptiveRateLimiter:
     """
-    Fetch quarterly balance sheet data from İş Yatırım API.
-    Returns a dict of {year: raw_json_response} for each year.
+    Thread-safe token bucket with an adaptive refill rate (AIMD).
+    
+    acquire() blocks until a request may be sent. on_success() raises the rate
+    additively; on_throttle() halves it, empties the bucket and honours the
+    server's Retry-After, so concurrent workers never exceed what upstream allows.
+    """
+    
+    def __init__(self, rate=4.0, burst=None, min_rate=0.25, max_rate=20.0, increase=0.05, decrease=0.5):
+        import threading
+        import time
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.throttled = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        import time
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    elapsed = max(0.0, now - self._updated)
+                    self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.burst = max(self.burst, min(self.rate, self.max_rate))
+    
+    def on_throttle(self, retry_after=None):
+        import time
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.burst = max(1.0, self.rate)
+            self._tokens = 0.0
+            pause = retry_after if retry_after else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+            self._updated = self._blocked_until
+
+
+@st.cache_resource
+def get_isyatirim_limiter():
+    """Process-wide rate limiter shared by every session talking to İş Yatırım."""
+    return AdaptiveRateLimiter(rate=ISYATIRIM_RATE, max_rate=ISYATIRIM_MAX_RATE)
+
+
+FINANCIAL_CACHE_TTL = 3600  # refresh window for (symbol, year) statement fetches, seconds
+
+
+class FinancialFetchEngine:
+    """
+    The single place MaliTablo statements are downloaded.
     
-    Includes retry logic (2 attempts per year) and does NOT cache empty results
-    so a transient API failure doesn't poison the cache for an hour.
+    Results are cached per (symbol, year) for one refresh window, shared by the
+    live single-stock view and the bulk importer. If several threads ask for the
+    same key at once, one request is sent and the others wait for its result.
+    Failed requests (timeouts, HTTP errors) are not cached.
     """
-    if years is None:
-        current_year = datetime.now().year
-        years = list(range(current_year, current_year - 5, -1))
     
-    all_data = {}
-    last_error = None
+    def __init__(self, ttl=FINANCIAL_CACHE_TTL):
+        import threading
+        self.ttl = ttl
+        self._cache = {}     # (symbol, year) -> (fetched_at, items or None)
+        self._inflight = {}  # (symbol, year) -> threading.Event
+        self._lock = threading.Lock()
     
-    for y in years:
+    def _request_year(self, symbol, year):
+        """Download one year (4 quarters). Returns items (None if the year has no filings); raises on failure."""
         params = {
             "companyCode": symbol,
             "exchange": "TRY",
             "financialGroup": "XI_29",
-            "year1": y, "period1": "12",
-            "year2": y, "period2": "9",
-            "year3": y, "period3": "6",
-            "year4": y, "period4": "3",
+            "year1": year, "period1": "12",
+            "year2": year, "period2": "9",
+            "year3": year, "period3": "6",
+            "year4": year, "period4": "3",
         }
-        
-        # Retry up to 2 times per year
-        for attempt in range(2):
+        resp = http_get(
+            ISYATIRIM_API_URL, verify=False, params=params,
+            timeout=20, limiter=get_isyatirim_limiter(),
+            headers={"User-Agent": "Mozilla/5.0", "Accept": "application/json"}
+        )
+        if resp.status_code != 200:
+            raise Exception(f"HTTP {resp.status_code}")
+        json_data = resp.json()
+        # API may return 200 with empty data — valid (no data for this year)
+        return json_data["value"] if "value" in json_data and json_data["value"] else None
+    
+    def fetch_year(self, symbol, year):
+        """Cached/deduplicated fetch of one (symbol, year)."""
+        import threading
+        import time
+        key = (symbol, year)
+        while True:
+            with self._lock:
+                hit = self._cache.get(key)
+                if hit is not None and time.time() - hit[0] < self.ttl:
+                    return hit[1]
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break  # This thread does the request
+            # Another thread is fetching this key: wait, then re-check the cache
+            # (if that request failed, this thread retries it)
+            event.wait()
+        try:
+            items = self._request_year(symbol, year)
+            with self._lock:
+                self._cache[key] = (time.time(), items)
+            return items
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+    
+    def fetch(self, symbol, years=None):
+        """Fetch several years. Returns ({year: items}, last_error)."""
+        if years is None:
+            current_year = datetime.now().year
+            years = list(range(current_year, current_year - 5, -1))
+        all_data = {}
+        last_error = None
+        for y in years:
             try:
-                resp = requests.get(
-                    ISYATIRIM_API_URL, verify=False, params=params,
-                    timeout=20,
-                    headers={"User-Agent": "Mozilla/5.0", "Accept": "application/json"}
-                )
-                if resp.status_code == 200:
-                    json_data = resp.json()
-                    if "value" in json_data and json_data["value"]:
-                        all_data[y] = json_data["value"]
-                        break  # Success, move to next year
-                    else:
-                        # API returned 200 but empty data — may be valid (no data for this year)
-                        break
-                elif resp.status_code == 503 or resp.status_code == 429:
-                    # Server overloaded or rate-limited — wait and retry
-                    import time
-                    time.sleep(2)
-                    continue
-                else:
-                    last_error = f"HTTP {resp.status_code}"
-                    break
+                items = self.fetch_year(symbol, y)
+                if items:
+                    all_data[y] = items
             except requests.exceptions.Timeout:
                 last_error = "Request timeout"
-                if attempt == 0:
-                    import time
-                    time.sleep(1)
-                    continue
             except requests.exceptions.ConnectionError:
                 last_error = "Connection error (check internet)"
-                break
             except Exception as e:
                 last_error = str(e)
-                break
+        return all_data, last_error
+    
+    def clear(self, symbol=None):
+        """Drop cached years (all symbols, or just one)."""
+        with self._lock:
+            if symbol is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == symbol]:
+                    del self._cache[key]
+
+
+@st.cache_resource
+def get_financial_engine():
+    """Process-wide financial fetch engine shared by every session."""
+    return FinancialFetchEngine()
+
+
+def fetch_balance_sheet(symbol, years=None):
+    """
+    Fetch quarterly balance sheet data from İş Yatırım API.
+    Returns a dict of {year: raw_json_response} for each year.
     
-    # CRITICAL: If we got NO data at all, raise an exception to prevent
-    # st.cache_data from caching the empty result. The next call will retry.
+    Goes through the shared fetch engine (cached per symbol/year, retries from
+    the HTTP transport). Raises if nothing came back so callers can show the error.
+    """
+    all_data, last_error = get_financial_engine().fetch(symbol, years)
     if not all_data:
         error_msg = f"İş Yatırım API returned no data for {symbol}"
         if last_error:
             error_msg += f" (last error: {last_error})"
         raise Exception(error_msg)
-    
-    return all_data
-
-
-def _fetch_single_stock_financials(symbol, years=None):
-    """
-    Fetch financials for a single stock directly (no caching decorator).
-    Used by the bulk import process.
-    """
-    if years is None:
-        current_year = datetime.now().year
-        years = list(range(current_year, current_year - 5, -1))
-    
-    all_data = {}
-    for y in years:
-        params = {
-            "companyCode": symbol,
-            "exchange": "TRY",
-            "financialGroup": "XI_29",
-            "year1": y, "period1": "12",
-            "year2": y, "period2": "9",
-            "year3": y, "period3": "6",
-            "year4": y, "period4": "3",
-        }
-        for attempt in range(2):
-            try:
-                resp = requests.get(
-                    ISYATIRIM_API_URL, verify=False, params=params,
-                    timeout=20,
-                    headers={"User-Agent": "Mozilla/5.0", "Accept": "application/json"}
-                )
-                if resp.status_code == 200:
-                    json_data = resp.json()
-                    if "value" in json_data and json_data["value"]:
-                        all_data[y] = json_data["value"]
-                    break
-                elif resp.status_code in (503, 429):
-                    import time
-                    time.sleep(2)
-                    continue
-                else:
-                    break
-            except Exception:
-                if attempt == 0:
-                    import time
-                    time.sleep(1)
-                    continue
-                break
     return all_data
 
 
-def import_all_financials(stock_list, sleep_between=1.5):
+def import_all_financials(stock_list, workers=None, progress=None):
     """
-    Bulk import financials for all stocks. Stores in session_state.
-    Uses a progress bar. Returns (success_count, error_list).
+    Bulk import financials for all stocks into the shared financial store.
+    Symbols are fetched by a small worker pool through the shared financial fetch
+    engine, so years already fetched by the live view are not requested again.
+    Uses a progress bar unless `progress(done, total, symbol)` is given.
+    Returns (success_count, error_list).
     """
-    import time
     errors = []
     success = 0
+    stock_list = list(stock_list)
     total = len(stock_list)
+    limiter = get_isyatirim_limiter()
+    engine = get_financial_engine()
     
-    prog = st.progress(0)
-    status = st.empty()
-    
-    for i, symbol in enumerate(stock_list):
-        status.text(f"📥 Importing {symbol}... ({i+1}/{total})")
-        prog.progress((i + 1) / total)
+    show = progress is None
+    if show:
+        prog = st.progress(0)
+        status = st.empty()
         
-        try:
-            raw_data = _fetch_single_stock_financials(symbol)
-            if raw_data:
-                st.session_state.financial_store[symbol] = raw_data
+        def progress(done, total, symbol):
+            status.text(f"📥 Imported {symbol} ({done}/{total}) · {limiter.rate:.1f} req/s")
+            prog.progress(done / total)
+    
+    def _import_symbol(s):
+        # The valuation basis is built here, in the worker, while other symbols are downloading
+        raw_data = engine.fetch(s)[0]
+        return (raw_data, compute_valuation_basis(raw_data)) if raw_data else None
+    
+    results = iter_symbol_pool(stock_list, _import_symbol, workers=workers or IMPORT_WORKERS, timeout=0)
+    imported, bases = {}, {}
+    try:
+        for done, (_, symbol, result) in enumerate(results, start=1):
+            progress(done, total, symbol)
+            if result:
+                imported[symbol], bases[symbol] = result
                 success += 1
             else:
                 errors.append(symbol)
-        except Exception:
-            errors.append(symbol)
-        
-        # Gentle delay to avoid rate-limiting
-        if i < total - 1:
-            time.sleep(sleep_between)
-    
-    prog.empty()
-    status.empty()
-    
-    st.session_state.financial_import_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-    st.session_state.financial_import_errors = errors
+    finally:
+        # Publish what was fetched as one new store version — also when the run is interrupted.
+        # A run that fetched nothing leaves the store (version and "Last import") untouched.
+        if imported:
+            get_financial_store().publish(imported, import_time=datetime.now().strftime("%Y-%m-%d %H:%M"), bases=bases)
     
-    # Persist to file
-    _save_financial_store()
+    if show:
+        prog.empty()
+        status.empty()
+        st.session_state.financial_import_errors = errors
     
     return success, errors
 
@@ -969,8 +3661,9 @@ def get_financial_data(symbol):
     Returns raw_data dict or None.
     """
     # 1. Check session store (bulk imported data)
-    if symbol in st.session_state.financial_store:
-        return st.session_state.financial_store[symbol]
+    raw_data = get_financial_store().get(symbol)
+    if raw_data:
+        return raw_data
     
     # 2. Fallback: try live API fetch
     try:
@@ -989,7 +3682,7 @@ def fetch_valuation_data(symbol):
     url = "https://www.isyatirim.com.tr/_layouts/15/IsYatirim.Website/Common/Data.aspx/OneEndeks498498"
     params = {"companyCode": symbol, "exchange": "TRY", "dataType": "2"}
     try:
-        resp = requests.get(url, verify=False, params=params, timeout=15)
+        resp = http_get(url, verify=False, params=params, timeout=15)
         if resp.status_code == 200:
             data = resp.json()
             if "value" in data and data["value"]:
@@ -1008,7 +3701,7 @@ def fetch_valuation_data(symbol):
     url2 = "https://www.isyatirim.com.tr/_layouts/15/IsYatirim.Website/Common/Data.aspx/HisseTekil"
     params2 = {"hession": f"{symbol}.E.BIST"}
     try:
-        resp2 = requests.get(url2, verify=False, params=params2, timeout=15)
+        resp2 = http_get(url2, verify=False, params=params2, timeout=15)
         if resp2.status_code == 200:
             return resp2.json()
     except Exception:
@@ -1032,7 +3725,15 @@ def calculate_valuation_metrics(df_full, current_price, valuation_data=None):
     """
     if df_full is None or df_full.empty or current_price is None or current_price <= 0:
         return {}
-    
+    return _price_valuation_inputs(_valuation_inputs(df_full), current_price)
+
+
+def _valuation_inputs(df_full):
+    """
+    The price-independent part of calculate_valuation_metrics: share count, TTM
+    earnings and EBITDA, equity, debt, cash and ROE of the latest period.
+    Returns {} if the statements have no periods.
+    """
     UNIT = 1000  # API values are in thousands TL; multiply by UNIT to get actual TL
     
     def get_val(logical_key, period):
@@ -1050,6 +3751,8 @@ def calculate_valuation_metrics(df_full, current_price, valuation_data=None):
         return {}
     
     latest = periods[0]  # Most recent period (empty ones already stripped)
+    quarter = latest.split("/")[1]
+    annualization_factor = {"12": 1, "9": 12/9, "6": 12/6, "3": 12/3}.get(quarter, 1)
     
     # All values below are in THOUSANDS TL as returned by the API
     total_equity = get_val("total_equity", latest)
@@ -1061,25 +3764,16 @@ def calculate_valuation_metrics(df_full, current_price, valuation_data=None):
     long_debt = get_val("long_borrowings", latest)
     cash = get_val("cash", latest)
     
-    result = {"period": latest}
+    inputs = {"period": latest, "total_equity": total_equity}
     
     # ── Shares Outstanding ──
     # BIST stocks have a par value of 1 TL per share.
     # Paid-in capital (Ödenmiş Sermaye) in actual TL = number of shares.
     # API gives paid_in_capital in thousands TL, so:
     #   shares = paid_in_capital * 1000
-    shares = None
-    if paid_in_capital and paid_in_capital > 0:
-        shares = paid_in_capital * UNIT  # actual number of shares
-        result["shares"] = shares
-    
-    # ── Market Cap = Price × Shares (result in TL) ──
-    market_cap = None
-    if shares and current_price:
-        market_cap = current_price * shares  # in TL
-        result["market_cap"] = market_cap
+    inputs["shares"] = paid_in_capital * UNIT if paid_in_capital and paid_in_capital > 0 else None
     
-    # ── P/E Ratio (F/K) = Market Cap / TTM Net Profit ──
+    # ── TTM Net Profit ──
     # İş Yatırım income statement figures are CUMULATIVE for the year:
     #   /12 = full year, /9 = first 9 months, /6 = first 6 months, /3 = first 3 months
     # To get TTM: use /12 directly, or annualize interim periods.
@@ -1094,19 +3788,8 @@ def calculate_valuation_metrics(df_full, current_price, valuation_data=None):
     
     # If no annual available, annualize the latest interim figure
     if ttm_net_profit_tl is None and net_profit is not None:
-        quarter = latest.split("/")[1]
-        annualization_factor = {"12": 1, "9": 12/9, "6": 12/6, "3": 12/3}.get(quarter, 1)
         ttm_net_profit_tl = net_profit * UNIT * annualization_factor
-    
-    if market_cap and ttm_net_profit_tl and ttm_net_profit_tl != 0:
-        result["pe_ratio"] = round(market_cap / ttm_net_profit_tl, 2)
-        result["ttm_net_profit"] = ttm_net_profit_tl
-    
-    # ── P/B Ratio (PD/DD) = Market Cap / Total Equity ──
-    if market_cap and total_equity and total_equity != 0:
-        total_equity_tl = total_equity * UNIT
-        result["pb_ratio"] = round(market_cap / total_equity_tl, 2)
-        result["total_equity"] = total_equity
+    inputs["ttm_net_profit"] = ttm_net_profit_tl
     
     # ── EBITDA = Operating Profit + |Depreciation & Amortization| ──
     # Both are cumulative for the period, in thousands TL.
@@ -1115,36 +3798,72 @@ def calculate_valuation_metrics(df_full, current_price, valuation_data=None):
     if operating_profit is not None:
         da = abs(depreciation) if (depreciation is not None and depreciation != 0) else 0
         ebitda_thousands = operating_profit + da
-        result["ebitda_period"] = ebitda_thousands
+    inputs["ebitda_period"] = ebitda_thousands
     
     # ── TTM EBITDA (annualize if interim period) ──
     ttm_ebitda_tl = None
     if ebitda_thousands is not None and ebitda_thousands != 0:
-        quarter = latest.split("/")[1]
-        annualization_factor = {"12": 1, "9": 12/9, "6": 12/6, "3": 12/3}.get(quarter, 1)
         ttm_ebitda_tl = ebitda_thousands * UNIT * annualization_factor
+    inputs["ttm_ebitda"] = ttm_ebitda_tl
+    
+    # ── Debt and cash for Enterprise Value = Market Cap + Total Debt - Cash ──
+    inputs["total_debt"] = ((short_debt or 0) + (long_debt or 0)) * UNIT
+    inputs["cash"] = (cash or 0) * UNIT
+    
+    # ── ROE for forward P/B calculation ──
+    inputs["roe"] = None
+    if total_equity and total_equity > 0 and net_profit and net_profit != 0:
+        annualized_np = net_profit * annualization_factor
+        inputs["roe"] = round(annualized_np / total_equity, 4)
+    
+    return inputs
+
+
+def _price_valuation_inputs(inputs, current_price):
+    """Apply a price to _valuation_inputs — the result of calculate_valuation_metrics."""
+    if not inputs:
+        return {}
+    UNIT = 1000
+    result = {"period": inputs["period"]}
+    shares = inputs.get("shares")
+    if shares:
+        result["shares"] = shares
+    
+    # ── Market Cap = Price × Shares (result in TL) ──
+    market_cap = None
+    if shares and current_price:
+        market_cap = current_price * shares  # in TL
+        result["market_cap"] = market_cap
+    
+    # ── P/E Ratio (F/K) = Market Cap / TTM Net Profit ──
+    ttm_net_profit_tl = inputs.get("ttm_net_profit")
+    if market_cap and ttm_net_profit_tl and ttm_net_profit_tl != 0:
+        result["pe_ratio"] = round(market_cap / ttm_net_profit_tl, 2)
+        result["ttm_net_profit"] = ttm_net_profit_tl
+    
+    # ── P/B Ratio (PD/DD) = Market Cap / Total Equity ──
+    total_equity = inputs.get("total_equity")
+    if market_cap and total_equity and total_equity != 0:
+        total_equity_tl = total_equity * UNIT
+        result["pb_ratio"] = round(market_cap / total_equity_tl, 2)
+        result["total_equity"] = total_equity
     
-    # ── Enterprise Value = Market Cap + Total Debt - Cash ──
-    total_debt_tl = ((short_debt or 0) + (long_debt or 0)) * UNIT
-    cash_tl = (cash or 0) * UNIT
+    if inputs.get("ebitda_period") is not None:
+        result["ebitda_period"] = inputs["ebitda_period"]
     
     if market_cap:
-        ev = market_cap + total_debt_tl - cash_tl
+        ev = market_cap + inputs["total_debt"] - inputs["cash"]
         result["enterprise_value"] = ev
         
         # ── EV/EBITDA ──
+        ttm_ebitda_tl = inputs.get("ttm_ebitda")
         if ttm_ebitda_tl and ttm_ebitda_tl > 0:
             ev_ebitda = ev / ttm_ebitda_tl
             result["ev_ebitda"] = round(ev_ebitda, 2)
             result["ttm_ebitda"] = ttm_ebitda_tl
     
-    # ── ROE for forward P/B calculation ──
-    if total_equity and total_equity > 0 and net_profit and net_profit != 0:
-        quarter = latest.split("/")[1]
-        ann_factor = {"12": 1, "9": 12/9, "6": 12/6, "3": 12/3}.get(quarter, 1)
-        annualized_np = net_profit * ann_factor
-        roe = annualized_np / total_equity
-        result["roe"] = round(roe, 4)
+    if inputs.get("roe") is not None:
+        result["roe"] = inputs["roe"]
     
     return result
 
@@ -1691,65 +4410,109 @@ def _cumulate_forecasts(standalone_forecasts):
     return sum(vals) if vals else None
 
 
-def compute_stock_valuations(symbol, current_price):
+def _build_valuation_frame(raw_data):
+    """Parse raw statements into the key-item DataFrame used for valuation, with a computed EBITDA row."""
+    all_key_items = {**KEY_ITEMS_BY_DESC, **KEY_INCOME_BY_DESC}
+    df_full = parse_balance_sheet_to_df(raw_data, item_filter=all_key_items)
+    if df_full is None or df_full.empty:
+        return None
+    
+    # Add EBITDA row
+    period_cols = [c for c in df_full.columns if "/" in c]
+    op_row = df_full[df_full["LogicalKey"] == "operating_profit"] if "LogicalKey" in df_full.columns else pd.DataFrame()
+    da_row = df_full[df_full["LogicalKey"] == "depreciation"] if "LogicalKey" in df_full.columns else pd.DataFrame()
+    if not op_row.empty:
+        ebitda_row_data = {"Code": "EBITDA_CALC", "LogicalKey": "ebitda", "Item (TR)": "EBITDA", "Item (EN)": "EBITDA"}
+        for p in period_cols:
+            op_val = pd.to_numeric(op_row.iloc[0].get(p), errors='coerce')
+            da_val = pd.to_numeric(da_row.iloc[0].get(p), errors='coerce') if not da_row.empty else 0
+            ebitda_row_data[p] = (op_val + (abs(da_val) if pd.notna(da_val) else 0)) if pd.notna(op_val) else None
+        df_full = pd.concat([df_full, pd.DataFrame([ebitda_row_data])], ignore_index=True)
+    return df_full
+
+
+def compute_valuation_basis(raw_data):
     """
-    Compute current and forward valuations for a single stock.
-    Returns dict with pe, pb, ev_ebitda, forward_pe, forward_ev_ebitda, etc.
-    Returns empty dict on failure.
+    Everything compute_stock_valuations needs that does not depend on the price:
+    the _valuation_inputs of the latest period plus the forecast TTM totals.
+    Built once per import and kept in the financial store. Returns None if the
+    statements can't be valued.
     """
-    result = {}
-    raw_data = get_financial_data(symbol)
-    if not raw_data or not current_price or current_price <= 0:
-        return result
-    
     try:
-        all_key_items = {**KEY_ITEMS_BY_DESC, **KEY_INCOME_BY_DESC}
-        df_full = parse_balance_sheet_to_df(raw_data, item_filter=all_key_items)
-        if df_full is None or df_full.empty:
-            return result
-        
-        # Add EBITDA row
-        period_cols = [c for c in df_full.columns if "/" in c]
-        op_row = df_full[df_full["LogicalKey"] == "operating_profit"] if "LogicalKey" in df_full.columns else pd.DataFrame()
-        da_row = df_full[df_full["LogicalKey"] == "depreciation"] if "LogicalKey" in df_full.columns else pd.DataFrame()
-        if not op_row.empty:
-            ebitda_row_data = {"Code": "EBITDA_CALC", "LogicalKey": "ebitda", "Item (TR)": "EBITDA", "Item (EN)": "EBITDA"}
-            for p in period_cols:
-                op_val = pd.to_numeric(op_row.iloc[0].get(p), errors='coerce')
-                da_val = pd.to_numeric(da_row.iloc[0].get(p), errors='coerce') if not da_row.empty else 0
-                ebitda_row_data[p] = (op_val + (abs(da_val) if pd.notna(da_val) else 0)) if pd.notna(op_val) else None
-            df_full = pd.concat([df_full, pd.DataFrame([ebitda_row_data])], ignore_index=True)
-        
-        # Current valuations
-        valuation = calculate_valuation_metrics(df_full, current_price)
-        if valuation:
-            result["pe"] = valuation.get("pe_ratio")
-            result["pb"] = valuation.get("pb_ratio")
-            result["ev_ebitda"] = valuation.get("ev_ebitda")
-            result["market_cap"] = valuation.get("market_cap")
-        
-        # Forward valuations
+        df_full = _build_valuation_frame(raw_data)
+        if df_full is None:
+            return None
+        basis = _valuation_inputs(df_full)
+        if not basis:
+            return None
         forecasts = forecast_financials(df_full)
-        if forecasts and valuation:
-            fwd = calculate_forward_valuations(current_price, valuation, forecasts)
-            result["fwd_pe"] = fwd.get("forward_pe")
-            result["fwd_pb"] = fwd.get("forward_pb")
-            result["fwd_ev_ebitda"] = fwd.get("forward_ev_ebitda")
-            result["roe"] = valuation.get("roe")
-        
-        # Deltas (positive = current is higher = stock getting cheaper on forward basis)
-        if result.get("pe") and result.get("fwd_pe"):
-            result["pe_delta"] = round(result["pe"] - result["fwd_pe"], 2)
-        if result.get("pb") and result.get("fwd_pb"):
-            result["pb_delta"] = round(result["pb"] - result["fwd_pb"], 2)
-        if result.get("ev_ebitda") and result.get("fwd_ev_ebitda"):
-            result["ev_ebitda_delta"] = round(result["ev_ebitda"] - result["fwd_ev_ebitda"], 2)
+        np_forecasts = forecasts.get("net_profit")
+        ebitda_forecasts = forecasts.get("ebitda")
+        basis["has_forecasts"] = bool(forecasts)
+        basis["forecast_net_profit"] = float(_cumulate_forecasts(np_forecasts)) if np_forecasts else None
+        basis["forecast_ebitda"] = float(_cumulate_forecasts(ebitda_forecasts)) if ebitda_forecasts else None
+        return basis
     except Exception:
-        pass
+        return None
+
+
+def value_from_basis(basis, current_price):
+    """Current and forward valuations from a valuation basis and a price — see compute_stock_valuations."""
+    result = {}
+    if not basis or not current_price or current_price <= 0:
+        return result
+    
+    # Current valuations
+    valuation = _price_valuation_inputs(basis, current_price)
+    if valuation:
+        result["pe"] = valuation.get("pe_ratio")
+        result["pb"] = valuation.get("pb_ratio")
+        result["ev_ebitda"] = valuation.get("ev_ebitda")
+        result["market_cap"] = valuation.get("market_cap")
+    
+    # Forward valuations
+    if basis.get("has_forecasts") and valuation:
+        fwd = _forward_from_forecast_totals(valuation, basis.get("forecast_net_profit"), basis.get("forecast_ebitda"))
+        result["fwd_pe"] = fwd.get("forward_pe")
+        result["fwd_pb"] = fwd.get("forward_pb")
+        result["fwd_ev_ebitda"] = fwd.get("forward_ev_ebitda")
+        result["roe"] = valuation.get("roe")
+    
+    # Deltas (positive = current is higher = stock getting cheaper on forward basis)
+    if result.get("pe") and result.get("fwd_pe"):
+        result["pe_delta"] = round(result["pe"] - result["fwd_pe"], 2)
+    if result.get("pb") and result.get("fwd_pb"):
+        result["pb_delta"] = round(result["pb"] - result["fwd_pb"], 2)
+    if result.get("ev_ebitda") and result.get("fwd_ev_ebitda"):
+        result["ev_ebitda_delta"] = round(result["ev_ebitda"] - result["fwd_ev_ebitda"], 2)
     
     return result
 
 
+def compute_stock_valuations(symbol, current_price, allow_live=True):
+    """
+    Compute current and forward valuations for a single stock.
+    Imported stocks are valued from the precomputed basis in the financial store;
+    others fall back to parsing live statements, unless allow_live is False.
+    Returns dict with pe, pb, ev_ebitda, forward_pe, forward_ev_ebitda, etc.
+    Returns empty dict on failure.
+    """
+    if not current_price or current_price <= 0:
+        return {}
+    basis = get_financial_store().valuation_basis(symbol)
+    if basis is None:
+        if not allow_live:
+            return {}
+        raw_data = get_financial_data(symbol)
+        if not raw_data:
+            return {}
+        basis = compute_valuation_basis(raw_data)
+    try:
+        return value_from_basis(basis, current_price)
+    except Exception:
+        return {}
+
+
 def calculate_forward_valuations(current_price, valuation, forecasts):
     """
     Calculate forward P/E, P/B, EV/EBITDA using forecasted financials.
@@ -1760,6 +4523,17 @@ def calculate_forward_valuations(current_price, valuation, forecasts):
     
     Returns dict with forward_pe, forward_pb, forward_ev_ebitda.
     """
+    np_forecasts = forecasts.get("net_profit")
+    ebitda_forecasts = forecasts.get("ebitda")
+    return _forward_from_forecast_totals(
+        valuation,
+        _cumulate_forecasts(np_forecasts) if np_forecasts else None,
+        _cumulate_forecasts(ebitda_forecasts) if ebitda_forecasts else None,
+    )
+
+
+def _forward_from_forecast_totals(valuation, ttm_forecast_np, ttm_forecast_ebitda):
+    """calculate_forward_valuations given the forecast TTM totals (thousands TL, None if not forecast)."""
     result = {}
     UNIT = 1000
     
@@ -1770,24 +4544,18 @@ def calculate_forward_valuations(current_price, valuation, forecasts):
         return result
     
     # Forward P/E
-    np_forecasts = forecasts.get("net_profit")
-    if np_forecasts:
-        ttm_forecast_np = _cumulate_forecasts(np_forecasts)
-        if ttm_forecast_np and ttm_forecast_np != 0:
-            forward_pe = market_cap / (ttm_forecast_np * UNIT)
-            if 0.5 < forward_pe < 500:
-                result["forward_pe"] = round(forward_pe, 2)
-                result["forecast_net_profit"] = ttm_forecast_np
+    if ttm_forecast_np and ttm_forecast_np != 0:
+        forward_pe = market_cap / (ttm_forecast_np * UNIT)
+        if 0.5 < forward_pe < 500:
+            result["forward_pe"] = round(forward_pe, 2)
+            result["forecast_net_profit"] = ttm_forecast_np
     
     # Forward EV/EBITDA
-    ebitda_forecasts = forecasts.get("ebitda")
-    if ebitda_forecasts and ev:
-        ttm_forecast_ebitda = _cumulate_forecasts(ebitda_forecasts)
-        if ttm_forecast_ebitda and ttm_forecast_ebitda != 0:
-            forward_ev_ebitda = ev / (ttm_forecast_ebitda * UNIT)
-            if 0.5 < forward_ev_ebitda < 200:
-                result["forward_ev_ebitda"] = round(forward_ev_ebitda, 2)
-                result["forecast_ebitda"] = ttm_forecast_ebitda
+    if ev and ttm_forecast_ebitda and ttm_forecast_ebitda != 0:
+        forward_ev_ebitda = ev / (ttm_forecast_ebitda * UNIT)
+        if 0.5 < forward_ev_ebitda < 200:
+            result["forward_ev_ebitda"] = round(forward_ev_ebitda, 2)
+            result["forecast_ebitda"] = ttm_forecast_ebitda
     
     # Forward P/B = Market Cap / (Current Equity × (1 + ROE))
     # ROE-adjusted: equity grows by retained earnings at the ROE rate
@@ -1820,13 +4588,13 @@ def display_balance_sheet(symbol, current_price=None):
     st.caption("Source: İş Yatırım | Quarterly data, last 5 years")
     
     # ── Data source: prefer imported store, fallback to live API ──
-    is_from_store = symbol in st.session_state.financial_store
+    is_from_store = symbol in get_financial_store()
     raw_data = None
     fetch_error = None
     
     if is_from_store:
-        raw_data = st.session_state.financial_store[symbol]
-        import_time = st.session_state.financial_import_time or "Unknown"
+        raw_data = get_financial_store()[symbol]
+        import_time = get_financial_store().import_time or "Unknown"
         st.caption(f"📦 Using imported data (last import: {import_time})")
     else:
         # No imported data for this stock — try live API
@@ -1841,17 +4609,17 @@ def display_balance_sheet(symbol, current_price=None):
         if fetch_error:
             st.caption(f"API error: {fetch_error}")
         
-        if not st.session_state.financial_store:
+        if not get_financial_store():
             st.markdown("""
             **💡 Tip:** Use the **📥 Import Financials** button in the sidebar to bulk-download  
             all financial data once. After importing, financials load instantly from local storage  
             and work even when İş Yatırım is down.
             """)
         else:
-            st.caption(f"ℹ️ {len(st.session_state.financial_store)} stocks are imported. This stock was not found — it may lack financial filings.")
+            st.caption(f"ℹ️ {len(get_financial_store())} stocks are imported. This stock was not found — it may lack financial filings.")
         
         if st.button(f"🔄 Try fetching {symbol} from API", key=f"retry_fin_{symbol}"):
-            fetch_balance_sheet.clear()
+            get_financial_engine().clear(symbol)
             st.rerun()
         return
     
@@ -3249,7 +6017,7 @@ def fetch_yahoo_chart(ticker, period="10y", interval="1wk"):
         url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
         params = {"period1": start_ts, "period2": end_ts, "interval": interval}
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-        resp = requests.get(url, params=params, headers=headers, timeout=20)
+        resp = http_get(url, params=params, headers=headers, timeout=20)
         if resp.status_code == 200:
             data = resp.json()
             result = data.get("chart", {}).get("result", [])
@@ -3285,7 +6053,7 @@ def fetch_oecd_data(dataset, subject, country, measure, freq, start_year=2010):
         try:
             headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
                        "Accept": "application/json"}
-            resp = requests.get(url, headers=headers, timeout=30)
+            resp = http_get(url, headers=headers, timeout=30)
             if resp.status_code != 200:
                 continue
             data = resp.json()
@@ -3336,7 +6104,7 @@ def fetch_cds_data(country_name):
             "Accept-Language": "en-US,en;q=0.5",
             "Referer": "https://www.worldgovernmentbonds.com/",
         }
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = http_get(url, headers=headers, timeout=20)
         if resp.status_code != 200:
             return None
         
@@ -3574,42 +6342,85 @@ def display_macro_analysis():
 
 
 
+# Every key of a Value Finder row (value_from_basis output plus symbol and price)
+VALUE_FINDER_COLUMNS = ['symbol', 'price', 'pe', 'pb', 'ev_ebitda', 'market_cap', 'fwd_pe', 'fwd_pb',
+                        'fwd_ev_ebitda', 'roe', 'pe_delta', 'pb_delta', 'ev_ebitda_delta']
+
+def scan_value_finder(stock_list, interval="1d", workers=None, progress=None, errors=None):
+    """
+    Current and forward valuations of every stock at its latest price, as Value
+    Finder rows (compute_stock_valuations output plus symbol and price).
+    Uses a progress bar unless `progress(done, total, symbol)` is given. Symbols
+    whose bars could not be loaded are appended to `errors` when a list is given.
+    """
+    show = progress is None
+    days = TIMEFRAMES[interval]["days"]
+    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    if show:
+        prog = st.progress(0)
+        stat = st.empty()
+        
+        def progress(done, total, s):
+            stat.text(f"Analyzing {s}... ({done}/{total})")
+            prog.progress(done / total)
+    
+    def _value_symbol(s):
+        df = fetch_stock_data(s, start_date=start_date, interval=interval)
+        if df is None or df.empty:
+            if errors is not None:
+                errors.append(s)
+            return None
+        price = df['Close'].iloc[-1]
+        vals = compute_stock_valuations(s, price)
+        if not vals:
+            return None
+        vals['symbol'] = s
+        vals['price'] = round(price, 2)
+        return vals
+    
+    rows = run_symbol_pool(stock_list, _value_symbol, workers=workers, progress=progress)
+    if show:
+        prog.empty()
+        stat.empty()
+    return [row for row in rows if row]
+
+
 @st.cache_data(ttl=3600, show_spinner=False)
 def compute_sma50_breadth_history(stock_list, days=90):
     """
     Compute daily percentage of stocks above their 50-day SMA over the past 3 months.
     Returns DataFrame with date, pct_above, count_above, total columns.
     """
+    return sma50_breadth_history(stock_list, days=days)
+
+def sma50_breadth_history(stock_list, days=90, workers=None, progress=None, errors=None):
+    """
+    Uncached compute_sma50_breadth_history with fetch workers and a progress callback.
+    Symbols whose bars could not be loaded are appended to `errors` when a list is given.
+    """
+    stock_list = list(stock_list)
     start_date = (datetime.now() - timedelta(days=days + 60)).strftime("%Y-%m-%d")
     end_date = datetime.now().strftime("%Y-%m-%d")
     
-    # Collect daily close data for all stocks
-    all_closes = {}
-    for s in stock_list:
-        try:
-            ticker = bp.Ticker(s)
-            df = ticker.history(start=start_date, end=end_date, interval="1d")
-            if df is not None and not df.empty:
-                df.columns = [col.title() for col in df.columns]
-                all_closes[s] = df["Close"]
-        except Exception:
-            continue
-    
-    if not all_closes:
+    # Daily closes for all stocks as one aligned (symbols × dates) array
+    panel = MarketPanel.load(stock_list, interval="1d", start_date=start_date, end_date=end_date,
+                             workers=workers, progress=progress)
+    if errors is not None:
+        errors.extend(s for s in stock_list if panel is None or s not in panel)
+    if panel is None:
         return None
-    
-    # Build combined DataFrame
-    combined = pd.DataFrame(all_closes)
+    close = panel.close
     
     # Compute SMA50 for each stock
-    sma50 = combined.rolling(window=50, min_periods=50).mean()
+    sma50 = _rolling_mean(close, 50)
     
     # Boolean: is price above its SMA50?
-    above = combined > sma50
+    with np.errstate(invalid="ignore"):
+        above = close > sma50
     
     # Count stocks above SMA50 each day
-    count_above = above.sum(axis=1)
-    total_valid = above.notna().sum(axis=1)  # Stocks with enough data
+    count_above = pd.Series(above.sum(axis=0), index=panel.dates)
+    total_valid = pd.Series(len(panel), index=panel.dates)  # Stocks with data in the panel
     pct_above = (count_above / total_valid * 100).where(total_valid > 0)
     
     result = pd.DataFrame({
@@ -3631,6 +6442,12 @@ def main():
         st.markdown('<h1 class="main-header">📊 BIST Ultimate Analysis</h1>', unsafe_allow_html=True)
         st.info(f"📈 Analyzing {len(IMKB)} BIST stocks across 8 timeframes")
         
+        # Pick up financial imports published by other sessions since the last rerun
+        get_financial_store().refresh()
+        # Pick up market scans the background scheduler (or another session) published
+        scheduler = get_scan_scheduler()
+        sync_scan_snapshots(scheduler)
+        
         auth, msg = setup_tradingview_auth()
         st.session_state.authenticated = auth
         css = "status-realtime" if auth else "status-delayed"
@@ -3680,24 +6497,47 @@ def main():
                 stock = st.selectbox("Stock", stocks)
             else:
                 if st.button("🚀 Run Screener", use_container_width=True):
-                    with st.spinner("Screening..."):
-                        results = screen_chosen_stocks(IMKB, interval=selected_tf)
-                        st.session_state.chosen_stocks[selected_tf] = results
-                    st.success(f"✅ Found {len(results)} stocks!")
+                    st.session_state.scan_warnings.pop(selected_tf, None)
+                    # A scan of the latest closed bar is shared by every session
+                    if scheduler.is_running(selected_tf):
+                        st.info("⏳ A shared scan of this timeframe is running; results appear when it finishes")
+                    else:
+                        if scheduler.fresh(selected_tf, "chosen"):
+                            sync_scan_snapshots(scheduler)
+                            st.success(f"✅ Found {len(st.session_state.chosen_stocks.get(selected_tf, []))} stocks!")
+                        else:
+                            # Streamed into the results view; see "🔍 Chosen Stocks"
+                            st.session_state.screen_runs[selected_tf] = {
+                                'pending': list(IMKB), 'rows': [], 'errors': [], 'last_bars': {}, 'total': len(IMKB),
+                                'status': 'running', 'bar_close': scheduler.due_bar(selected_tf),
+                            }
             
             if mode == "📋 Market Summary":
                 if st.button("🔎 Scan All Stocks", use_container_width=True):
-                    with st.spinner("Scanning entire market..."):
-                        sentiment_counts, above_sma50, below_sma50, sma50_na = scan_market_summary(IMKB, interval=selected_tf)
-                        st.session_state.market_summary[selected_tf] = {
-                            'sentiment': sentiment_counts,
-                            'above_sma50': above_sma50,
-                            'below_sma50': below_sma50,
-                            'sma50_na': sma50_na,
-                            'scan_time': datetime.now().strftime("%Y-%m-%d %H:%M")
-                        }
-                    total_scanned = sum(len(v) for v in sentiment_counts.values())
-                    st.success(f"✅ Scanned {total_scanned} stocks!")
+                    if scheduler.is_running(selected_tf):
+                        st.info("⏳ A shared scan of this timeframe is running; results appear when it finishes")
+                    else:
+                        if not scheduler.fresh(selected_tf, "market_summary"):
+                            bar_close, last_bars = scheduler.due_bar(selected_tf), {}
+                            with st.spinner("Scanning entire market..."):
+                                summary = run_market_summary(IMKB, interval=selected_tf, last_bars=last_bars)
+                            failed = scheduler.scan_failures(selected_tf, bar_close, summary['sentiment']['ERROR'], last_bars)
+                            if not scheduler.publish_scan(selected_tf, "market_summary", bar_close, summary,
+                                                          summary['sentiment']['ERROR'], len(IMKB), last_bars):
+                                st.session_state.market_summary[selected_tf] = summary
+                                st.warning(f"⚠️ {len(failed)}/{len(IMKB)} stocks failed to load or miss the latest bar; "
+                                           f"this scan is not shared")
+                        sync_scan_snapshots(scheduler)
+                        total_scanned = sum(len(v) for v in st.session_state.market_summary[selected_tf]['sentiment'].values())
+                        st.success(f"✅ Scanned {total_scanned} stocks!")
+            
+            if mode in ("🔍 Stock Screener", "📋 Market Summary"):
+                snap = scheduler.snapshot(selected_tf, "chosen" if mode == "🔍 Stock Screener" else "market_summary")
+                if scheduler.is_running(selected_tf):
+                    st.caption("⏳ Shared background scan running...")
+                elif snap and snap["bar_close"] is not None:
+                    st.caption(f"🛰️ Shared scan v{snap['version']} · bar closed {snap['bar_close']:%d.%m %H:%M} · "
+                               f"scanned {snap['scan_time']}")
             
             if mode == "💎 Value Finder":
                 st.markdown("---")
@@ -3715,49 +6555,42 @@ def main():
                     vf_stocks = IMKB
                 st.caption(f"{len(vf_stocks)} stocks to scan")
                 
-                if not st.session_state.financial_store:
+                if not get_financial_store():
                     st.warning("⚠️ Import financials first for best results!")
                 
                 if st.button("💎 Scan for Value", use_container_width=True, type="primary"):
-                    vf_results = []
-                    prog = st.progress(0)
-                    stat = st.empty()
-                    days = TIMEFRAMES[selected_tf]["days"]
-                    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-                    
-                    for i, s in enumerate(vf_stocks):
-                        stat.text(f"Analyzing {s}... ({i+1}/{len(vf_stocks)})")
-                        prog.progress((i + 1) / len(vf_stocks))
-                        try:
-                            df = fetch_stock_data(s, start_date=start_date, interval=selected_tf)
-                            if df is None or df.empty:
-                                continue
-                            price = df['Close'].iloc[-1]
-                            vals = compute_stock_valuations(s, price)
-                            if vals:
-                                vals['symbol'] = s
-                                vals['price'] = round(price, 2)
-                                vf_results.append(vals)
-                        except:
-                            continue
-                    
-                    prog.empty()
-                    stat.empty()
+                    vf_results = scan_value_finder(vf_stocks, interval=selected_tf)
                     st.session_state.value_finder_results = vf_results
                     st.success(f"✅ Analyzed {len(vf_results)} stocks!")
                     st.rerun()
             
             if st.button("🔄 Refresh", use_container_width=True):
                 st.cache_data.clear()
+                get_financial_engine().clear()
+                get_indicator_cache().clear()
+                scheduler.discard()  # the next Run Screener / Scan All Stocks scans again
                 st.rerun()
             
+            if BAR_STORE_ENABLED and st.button("🗄️ Rebuild Price History", use_container_width=True,
+                                               help="Drop the local bar store; the next scans download full history"):
+                clear_stored_bars()
+                st.cache_data.clear()
+                get_indicator_cache().clear()
+                scheduler.discard()
+                st.rerun()
+            
+            net_stats = get_http_transport().host_stats()
+            if not net_stats.empty:
+                with st.expander("🌐 Upstream latency"):
+                    st.dataframe(net_stats, use_container_width=True, hide_index=True)
+            
             # ── Financial Data Import Section ──
             st.markdown("---")
             st.subheader("📥 Financial Data")
             
-            store_count = len(st.session_state.financial_store)
+            store_count = len(get_financial_store())
             if store_count > 0:
-                import_time = st.session_state.financial_import_time or "Unknown"
+                import_time = get_financial_store().import_time or "Unknown"
                 err_count = len(st.session_state.financial_import_errors)
                 st.success(f"✅ {store_count} stocks imported")
                 st.caption(f"Last import: {import_time}")
@@ -3783,20 +6616,25 @@ def main():
                 else:
                     target_list = IMKB
                 
-                success, errors = import_all_financials(target_list, sleep_between=1.0)
-                _save_financial_store()
-                st.success(f"✅ Imported {success}/{len(target_list)} stocks!")
-                if errors:
-                    st.warning(f"⚠️ {len(errors)} stocks failed: {', '.join(errors[:10])}{'...' if len(errors) > 10 else ''}")
+                success, errors = import_all_financials(target_list)
+                st.session_state.financial_import_result = (success, len(target_list), errors)  # shown after the rerun
                 st.rerun()
             
+            import_result = st.session_state.financial_import_result
+            if import_result:
+                success, n_target, errors = import_result
+                if success == 0:
+                    st.error(f"❌ Import failed: none of {n_target} stocks could be fetched — the store was not changed")
+                else:
+                    st.success(f"✅ Imported {success}/{n_target} stocks!")
+                    if errors:
+                        st.warning(f"⚠️ {len(errors)} stocks failed: {', '.join(errors[:10])}{'...' if len(errors) > 10 else ''}")
+            
             if store_count > 0:
                 if st.button("🗑️ Clear Imported Data", use_container_width=True):
-                    st.session_state.financial_store = {}
-                    st.session_state.financial_import_time = None
+                    get_financial_store().clear()
                     st.session_state.financial_import_errors = []
-                    if os.path.exists(FINANCIAL_STORE_FILE):
-                        os.remove(FINANCIAL_STORE_FILE)
+                    st.session_state.financial_import_result = None
                     st.rerun()
         
         if mode == "📊 Single Stock":
@@ -3806,7 +6644,7 @@ def main():
             with st.spinner(f"Loading {stock}..."):
                 df = fetch_stock_data(stock, start_date=start, end_date=end, interval=selected_tf)
             if df is not None and not df.empty:
-                df = calculate_all_indicators(df)
+                df = cached_indicators(stock, selected_tf, df)
                 ind1, vol1 = calculate_simplified_scores(df)
                 ind2, vol2 = calculate_original_scores(df)
                 latest = df.iloc[-1]
@@ -4009,8 +6847,8 @@ def main():
                 st.plotly_chart(create_candlestick(df, stock), use_container_width=True, config=PLOTLY_CONFIG)
                 
                 # Tabs for additional charts and analysis
-                tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-                    "📊 Volume", "📈 MACD", "📉 RSI",
+                tab1, tab2, tab3, tab7, tab4, tab5, tab6 = st.tabs([
+                    "📊 Volume", "📈 MACD", "📉 RSI", "🧭 Signals",
                     "🔮 Patterns", "🎲 Monte Carlo", "📐 Fibonacci"
                 ])
                 with tab1:
@@ -4019,6 +6857,10 @@ def main():
                     st.plotly_chart(create_macd_chart(df), use_container_width=True, config=PLOTLY_CONFIG)
                 with tab3:
                     st.plotly_chart(create_rsi_chart(df), use_container_width=True, config=PLOTLY_CONFIG)
+                with tab7:
+                    hist = signal_history(df)
+                    st.plotly_chart(create_signal_history_chart(hist), use_container_width=True, config=PLOTLY_CONFIG)
+                    st.caption(f"⭐ {int(hist['chosen'].sum())} of {len(hist)} bars met the screener rule (Indicator 2 ≥ 3, Volume 2 > 0.7)")
                 with tab4:
                     display_pattern_tab(df, stock)
                 with tab5:
@@ -4026,6 +6868,28 @@ def main():
                 with tab6:
                     display_fibonacci_tab(df, stock)
                 
+                # Trend and volatility from the indicator kernels
+                with st.expander("📐 Trend & Volatility"):
+                    warmup = max(kernel_warmup(name) for name in INDICATOR_KERNELS)
+                    if len(df) <= warmup:
+                        st.info(f"Needs more than {warmup} bars on this timeframe")
+                    else:
+                        k = compute_kernels(df[BAR_FIELDS].copy()).iloc[-1]
+                        kc1, kc2, kc3, kc4 = st.columns(4)
+                        kc1.metric("ATR (14)", f"₺{k['ATR']:.2f}", f"{k['ATR'] / k['Close'] * 100:.1f}% of price", delta_color="off")
+                        kc2.metric("ADX (14)", f"{k['ADX']:.1f}", f"+DI {k['ADX_POS']:.0f} / -DI {k['ADX_NEG']:.0f}", delta_color="off")
+                        kc3.metric("SuperTrend", "▲ Up" if k['SuperTrend_Dir'] > 0 else "▼ Down", f"₺{k['SuperTrend']:.2f}", delta_color="off")
+                        kc4.metric("VWAP (14)", f"₺{k['VWAP']:.2f}", f"{(k['Close'] / k['VWAP'] - 1) * 100:+.1f}% vs close")
+                        if k['Close'] > max(k['ICHI_A'], k['ICHI_B']):
+                            cloud = "above the cloud"
+                        elif k['Close'] < min(k['ICHI_A'], k['ICHI_B']):
+                            cloud = "below the cloud"
+                        else:
+                            cloud = "inside the cloud"
+                        cross = "above" if k['ICHI_CONV'] > k['ICHI_BASE'] else "below"
+                        st.caption(f"☁️ Ichimoku: price {cloud} · conversion line {cross} the base line · "
+                                   f"ADX above 25 marks a trending market")
+                
                 # Raw data expander
                 with st.expander("📋 View Raw Data"):
                     st.dataframe(df[['Open', 'High', 'Low', 'Close', 'Volume', 'RSI', 'MACD']].tail(100), use_container_width=True)
@@ -4037,6 +6901,57 @@ def main():
         
         elif mode == "🔍 Stock Screener":
             st.subheader("🔍 Chosen Stocks")
+            
+            # Progressive scan: qualifying rows appear as they are scored; cancel keeps them and can resume
+            run = st.session_state.screen_runs.get(selected_tf)
+            if run and run['status'] == 'running':
+                if st.button("⏹️ Cancel scan", key="screen_cancel"):
+                    run['status'] = 'stopped'
+                    st.session_state.chosen_stocks[selected_tf] = run['rows']
+                else:
+                    prog = st.progress(1 - len(run['pending']) / run['total'])
+                    stat = st.empty()
+                    table = st.empty()
+                    stream = iter_screen_chosen_stocks(list(run['pending']), interval=selected_tf, errors=run['errors'],
+                                                       last_bars=run['last_bars'])
+                    try:
+                        for s, row in stream:
+                            run['pending'].remove(s)
+                            done = run['total'] - len(run['pending'])
+                            stat.text(f"Screened {s} ({done}/{run['total']}) · {len(run['rows'])} chosen")
+                            prog.progress(done / run['total'])
+                            if row is not None:
+                                run['rows'].append(row)
+                                live = pd.DataFrame(run['rows']).sort_values('indicator_score_2', ascending=False)
+                                table.dataframe(live[['symbol', 'price', 'chg%', 'RSI', 'indicator_score_2', 'volume_score_2']],
+                                                use_container_width=True, hide_index=True)
+                    finally:
+                        stream.close()  # a cancel click interrupts the loop; drop the queued fetches
+                    del st.session_state.screen_runs[selected_tf]
+                    st.session_state.chosen_stocks[selected_tf] = run['rows']
+                    if scheduler.publish_scan(selected_tf, "chosen", run['bar_close'], run['rows'], run['errors'],
+                                              run['total'], run['last_bars']):
+                        sync_scan_snapshots(scheduler)
+                    else:
+                        failed = scheduler.scan_failures(selected_tf, run['bar_close'], run['errors'], run['last_bars'])
+                        st.session_state.scan_warnings[selected_tf] = (
+                            f"⚠️ {len(failed)}/{run['total']} stocks failed to load or miss the latest bar; "
+                            f"this scan is not shared")
+                    st.rerun()
+            if selected_tf in st.session_state.scan_warnings and not run:
+                st.warning(st.session_state.scan_warnings[selected_tf])
+            if run and run['status'] == 'stopped':
+                st.warning(f"⏸️ Scan stopped after {run['total'] - len(run['pending'])}/{run['total']} stocks; "
+                           f"showing partial results")
+                rc1, rc2 = st.columns(2)
+                with rc1:
+                    if st.button(f"▶️ Resume ({len(run['pending'])} left)", key="screen_resume"):
+                        run['status'] = 'running'
+                        st.rerun()
+                with rc2:
+                    if st.button("🗑️ Discard scan", key="screen_discard"):
+                        del st.session_state.screen_runs[selected_tf]
+                        st.rerun()
             if selected_tf in st.session_state.chosen_stocks and st.session_state.chosen_stocks[selected_tf]:
                 results = st.session_state.chosen_stocks[selected_tf]
                 df_c = pd.DataFrame(results).sort_values('indicator_score_2', ascending=False)
@@ -4052,10 +6967,21 @@ def main():
                     has_pe = df_c['P/E'].notna().sum()
                     st.metric("With Financials", f"{has_pe}/{len(df_c)}")
                 
+                # Valuations come from imported financials only; missing ones can be fetched on demand
+                n_missing = sum(1 for r in results if r.get('P/E') is None and r.get('PD/DD') is None)
+                enriched = st.session_state.valuation_enrich_results.pop(selected_tf, None)
+                if enriched is not None:
+                    filled, tried = enriched
+                    st.success(f"✅ Added valuations for {filled}/{tried} stocks")
+                if n_missing:
+                    if st.button(f"📥 Fetch financials for {n_missing} stocks without valuations"):
+                        filled = enrich_screener_valuations(results)
+                        st.session_state.chosen_stocks[selected_tf] = results
+                        st.session_state.valuation_enrich_results[selected_tf] = (filled, n_missing)  # shown after the rerun
+                        st.rerun()
+                
                 # Format display columns
-                display_cols = ['symbol', 'price', 'chg%', 'RSI', 'indicator_score_2', 'volume_score_2',
-                               'P/E', 'PD/DD', 'EV/EBITDA', 'Fwd P/E', 'Fwd PD/DD', 'Fwd EV/EBITDA', 'P/E Δ', 'EV/EBITDA Δ']
-                available_display = [c for c in display_cols if c in df_c.columns]
+                available_display = [c for c in SCREENER_COLUMNS if c in df_c.columns]
                 
                 st.dataframe(
                     df_c[available_display].style.format({
@@ -4064,6 +6990,7 @@ def main():
                         'RSI': '{:.1f}',
                         'indicator_score_2': '{:.1f}',
                         'volume_score_2': '{:.2f}',
+                        'ADX': '{:.1f}',
                         'P/E': '{:.1f}x',
                         'PD/DD': '{:.2f}x',
                         'EV/EBITDA': '{:.1f}x',
@@ -4096,6 +7023,127 @@ def main():
                         """, unsafe_allow_html=True)
             else:
                 st.info("Click 'Run Screener'")
+            
+            # Replay the chosen-stock rule over daily history for every symbol
+            with st.expander("🧪 Backtest the chosen-stock rule"):
+                bc1, bc2, bc3 = st.columns(3)
+                with bc1:
+                    bt_years = st.slider("Years of history", 1, 3, 2, key="bt_years")
+                with bc2:
+                    bt_ind = st.number_input("Min indicator score", 0.0, 10.0, 3.0, 0.5, key="bt_ind")
+                with bc3:
+                    bt_vol = st.number_input("Min volume score", 0.0, 3.0, 0.7, 0.1, key="bt_vol")
+                if st.button("▶️ Run Backtest", key="bt_run"):
+                    prog = st.progress(0)
+                    stat = st.empty()
+                    
+                    def _bt_progress(done, total, s):
+                        stat.text(f"Loaded {s} ({done}/{total})")
+                        prog.progress(done / total)
+                    
+                    start = (datetime.now() - timedelta(days=365 * bt_years)).strftime("%Y-%m-%d")
+                    with st.spinner("Backtesting..."):
+                        panel = MarketPanel.load(IMKB, "1d", start_date=start, progress=_bt_progress)
+                        if panel is not None:
+                            summary, trades = backtest_chosen_rule(panel, ind_min=bt_ind, vol_min=bt_vol)
+                            st.session_state.backtest_results = {
+                                'summary': summary, 'trades': trades,
+                                'years': bt_years, 'ind_min': bt_ind, 'vol_min': bt_vol,
+                            }
+                    prog.empty()
+                    stat.empty()
+                
+                bt = st.session_state.backtest_results
+                if bt:
+                    st.caption(f"{bt['years']}y daily · indicator ≥ {bt['ind_min']} · volume > {bt['vol_min']} · "
+                               f"{len(bt['trades'])} signals · entry at the signal bar's close")
+                    st.dataframe(bt['summary'].style.format({
+                        'hit_rate_%': '{:.1f}%', 'avg_return_%': '{:+.2f}%', 'median_return_%': '{:+.2f}%',
+                        'baseline_avg_%': '{:+.2f}%', 'avg_drawdown_%': '{:.2f}%', 'worst_drawdown_%': '{:.2f}%',
+                    }, na_rep='—'), use_container_width=True, hide_index=True)
+                    if not bt['trades'].empty:
+                        st.dataframe(bt['trades'].sort_values('date', ascending=False),
+                                     use_container_width=True, hide_index=True, height=300)
+            
+            # Grid search over thresholds and indicator windows, streamed as groups finish
+            with st.expander("🧮 Parameter sweep"):
+                sw1, sw2, sw3 = st.columns(3)
+                with sw1:
+                    sw_ind = st.multiselect("Min indicator score", [1, 2, 3, 4, 5, 6], [2, 3, 4, 5], key="sw_ind")
+                    sw_rsi = st.multiselect("RSI window", [7, 9, 14, 21, 28], [9, 14, 21], key="sw_rsi")
+                with sw2:
+                    sw_vol = st.multiselect("Min volume score", [0.5, 0.7, 1.0, 1.5, 2.0], [0.5, 0.7, 1.0, 1.5], key="sw_vol")
+                    sw_vsma = st.multiselect("Volume SMA window", [10, 15, 20, 30], [10, 15, 20], key="sw_vsma")
+                with sw3:
+                    sw_years = st.slider("Years of history", 1, 3, 2, key="sw_years")
+                    sw_sort = st.selectbox("Rank by", [f"avg_{h}%" for h in BACKTEST_HORIZONS] + [f"hit_{h}%" for h in BACKTEST_HORIZONS],
+                                           index=1, key="sw_sort")
+                grid = {**DEFAULT_SWEEP_GRID, "ind_min": sw_ind, "vol_min": sw_vol,
+                        "rsi_window": sw_rsi, "vsma_window": sw_vsma}
+                n_points = len(expand_sweep_grid(grid))
+                st.caption(f"{n_points} combinations · MACD and SMA windows from the default grid")
+                if st.button("▶️ Run Sweep", key="sw_run", disabled=n_points == 0):
+                    start = (datetime.now() - timedelta(days=365 * sw_years)).strftime("%Y-%m-%d")
+                    with st.spinner("Loading daily bars..."):
+                        panel = MarketPanel.load(IMKB, "1d", start_date=start)
+                    if panel is None:
+                        st.error("❌ No data available")
+                    else:
+                        st.button("⏹️ Stop sweep", key="sw_stop")  # a click reruns the script, interrupting the loop
+                        prog = st.progress(0)
+                        table = st.empty()
+                        rows = []
+                        sweep = iter_parameter_sweep(panel, grid)
+                        try:
+                            for row in sweep:
+                                rows.append(row)
+                                prog.progress(len(rows) / n_points)
+                                if len(rows) % 16 == 0 or len(rows) == n_points:
+                                    sweep_df = pd.DataFrame(rows).sort_values(sw_sort, ascending=False)
+                                    st.session_state.sweep_results = sweep_df  # kept if the sweep is stopped
+                                    table.dataframe(sweep_df.astype({c: str for c in ("sma_windows",) if c in sweep_df}),
+                                                    use_container_width=True, hide_index=True, height=400)
+                        finally:
+                            sweep.close()  # cancel the queued groups
+                        prog.empty()
+                        st.session_state.sweep_results = pd.DataFrame(rows)
+                elif st.session_state.sweep_results is not None:
+                    sweep_df = st.session_state.sweep_results.sort_values(sw_sort, ascending=False)
+                    st.dataframe(sweep_df.astype({c: str for c in ("sma_windows",) if c in sweep_df}),
+                                 use_container_width=True, hide_index=True, height=400)
+            
+            # Chosen-stock rule on several timeframes from one fetch per base interval
+            with st.expander("🧭 Multi-timeframe confluence"):
+                default_tfs = [tf for tf in ("1h", "4h", "1d") if tf in available_tf] or [selected_tf]
+                mtf = st.multiselect("Timeframes", list(available_tf.keys()), default_tfs,
+                                     format_func=lambda x: TIMEFRAMES[x]["label"], key="mtf_intervals")
+                if st.button("🧭 Scan Confluence", key="mtf_run", disabled=not mtf):
+                    prog = st.progress(0)
+                    stat = st.empty()
+                    
+                    def _mtf_progress(done, total, s):
+                        stat.text(f"Loaded {s} ({done}/{total})")
+                        prog.progress(done / total)
+                    
+                    with st.spinner("Scanning timeframes..."):
+                        st.session_state.confluence_results = scan_timeframe_confluence(IMKB, mtf, progress=_mtf_progress)
+                    prog.empty()
+                    stat.empty()
+                
+                conf = st.session_state.confluence_results
+                if conf is not None:
+                    tfs = [c for c in conf.columns if c in TIMEFRAMES]
+                    min_conf = st.slider("Chosen on at least", 1, len(tfs), 2, key="mtf_min") if len(tfs) > 1 else 1
+                    shown = conf[conf['confluence'] >= min_conf]
+                    st.caption(f"{len(shown)} stocks chosen on ≥ {min_conf} of {', '.join(tfs)}")
+                    st.dataframe(
+                        shown.reset_index().style.format(
+                            {**{tf: lambda v: "✅" if v else "" for tf in tfs},
+                             **{c: '{:.1f}' for c in conf.columns if c.startswith('ind ')},
+                             **{c: '{:.2f}' for c in conf.columns if c.startswith('vol ')}},
+                            na_rep='—'),
+                        use_container_width=True, hide_index=True, height=min(400, 35 * len(shown) + 38)
+                    )
         
         elif mode == "📋 Market Summary":
             st.subheader(f"📋 Market Summary - {TIMEFRAMES[selected_tf]['label']}")